@@ -1,4 +1,7 @@
 # -*- coding: utf-8 -*-
+import threading
+from typing import Callable, Optional
+
 from PySide2.QtWidgets import QMessageBox, QApplication
 
 from ..bwutils import (
@@ -9,23 +12,60 @@ from bw2calc.errors import BW2CalcError
 import brightway2 as bw
 
 from .errors import ReferenceFlowValueError
+from .result_cache import ResultCache
+
+# The (pypardiso) solvers are not thread-safe and the LCA object of an MLCA
+# is shared with the sankey and Monte Carlo LCA, calculate one at a time.
+calculation_lock = threading.Lock()
+
+
+def do_LCA_calculations(data: dict, progress: Optional[Callable[[int, int], None]] = None):
+    """Perform the MLCA calculation.
 
-def do_LCA_calculations(data: dict):
-    """Perform the MLCA calculation."""
+    The optional `progress` callable is passed on to the `MLCA`. If
+    the results of an identical calculation are cached, the cached MLCA is
+    returned instead, without constructing or calculating it.
+    """
     cs_name = data.get('cs_name', 'new calculation')
     calculation_type = data.get('calculation_type', 'simple')
+    # Optional storage backend for the contribution arrays and technosphere solver.
+    options = {
+        'storage': data.get('contribution_storage', 'float64'),
+        'top_n': data.get('contribution_top_n'),
+        'solver': data.get('solver', 'direct'),
+        'tol': data.get('solver_tol', 1e-8),
+    }
+    df = data.get('data') if calculation_type == 'scenario' else None
+
+    # Reuse the results of an earlier identical calculation if possible.
+    cache = ResultCache() if data.get('use_cache', True) else None
+    cacheable = cache is not None and cs_name in bw.calculation_setups and calculation_type in ('simple', 'scenario')
+    key = cache.key(cs_name, options, df) if cacheable else None
+    mlca = cache.load(key) if key else None
+    if mlca is None:
+        mlca = construct_MLCA(cs_name, calculation_type, dict(options, progress=progress),
+                              df, data.get('workers', 1))
+        mlca.calculate()
+        if key:
+            cache.save(key, mlca)
+
+    if calculation_type == 'scenario':
+        contributions = SuperstructureContributions(mlca)
+    else:
+        contributions = Contributions(mlca)
+    return mlca, contributions
+
 
+def construct_MLCA(cs_name: str, calculation_type: str, options: dict, df=None, workers: int = 1) -> MLCA:
+    """Construct the MLCA of the given calculation type."""
     if calculation_type == 'simple':
         try:
-            mlca = MLCA(cs_name)
-            contributions = Contributions(mlca)
+            return MLCA(cs_name, **options)
         except KeyError as e:
             raise BW2CalcError("LCA Failed", str(e)).with_traceback(e.__traceback__)
     elif calculation_type == 'scenario':
         try:
-            df = data.get('data')
-            mlca = SuperstructureMLCA(cs_name, df)
-            contributions = SuperstructureContributions(mlca)
+            return SuperstructureMLCA(cs_name, df, workers=workers, **options)
         except AssertionError as e:
             # This occurs if the superstructure itself detects something is wrong.
             raise BW2CalcError("Scenario LCA failed.", str(e)).with_traceback(e.__traceback__)
@@ -42,7 +82,9 @@ def do_LCA_calculations(data: dict):
         print('Calculation type must be: simple or scenario. Given:', cs_name)
         raise ValueError
 
-    mlca.calculate()
-    mc = MonteCarloLCA(cs_name)
 
-    return mlca, contributions, mc
+def create_MonteCarloLCA(mlca) -> MonteCarloLCA:
+    """Construct the Monte Carlo LCA for the calculation setup of the MLCA,
+    borrowing the inventory data already loaded by the MLCA.
+    """
+    return MonteCarloLCA(mlca.cs_name, shared_lca=mlca.lca)
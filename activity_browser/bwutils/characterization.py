@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Project-level cache of the characterization matrices of impact categories.
+
+Building a characterization matrix requires loading the processed method
+file and mapping every characterization factor onto the biosphere matrix.
+The MLCA, Monte Carlo and Sankey calculations all build the matrices of the
+same impact categories against the same biosphere, so the matrices are
+built once and shared between them.
+"""
+from collections import OrderedDict
+import hashlib
+import os
+from typing import Hashable
+
+import brightway2 as bw
+import numpy as np
+
+
+class CharacterizationCache(object):
+    """LRU cache of the `cf_params` and `characterization_matrix` of
+    impact categories.
+
+    The matrices are keyed on the project, the impact category, the
+    modification stamp of its processed data and the biosphere dictionary
+    of the LCA object. The cached arrays and matrices are shared between
+    LCA objects and should not be altered in place.
+    """
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    @staticmethod
+    def method_stamp(method: tuple) -> tuple:
+        """Modification stamp of the processed data of the impact category."""
+        stat = os.stat(bw.Method(method).filepath_processed())
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def biosphere_fingerprint(lca) -> str:
+        biosphere = lca._biosphere_dict
+        ids = np.fromiter(biosphere.keys(), dtype=np.int64, count=len(biosphere))
+        rows = np.fromiter(biosphere.values(), dtype=np.int64, count=len(biosphere))
+        order = np.argsort(ids)
+        return hashlib.sha1(ids[order].tobytes() + rows[order].tobytes()).hexdigest()
+
+    def _key(self, lca, method: tuple) -> Hashable:
+        return bw.projects.current, method, self.method_stamp(method), self.biosphere_fingerprint(lca)
+
+    def load(self, lca, method: tuple) -> None:
+        """Switch the LCA object to the given impact category, similar to
+        `LCA.switch_method`, reusing the cached matrices if possible.
+        """
+        key = self._key(lca, method)
+        if key in self._data:
+            self._data.move_to_end(key)
+            lca.method = method
+            _, lca.method_filepath, _, _ = lca.get_array_filepaths()
+            lca.cf_params, lca.characterization_matrix = self._data[key]
+            return
+        lca.switch_method(method)
+        self._data[key] = (lca.cf_params, lca.characterization_matrix)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, method: tuple) -> None:
+        """Drop all of the cached matrices of the impact category."""
+        for key in [k for k in self._data if k[1] == method]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+characterization_cache = CharacterizationCache()
@@ -6,6 +6,11 @@ class ImportCanceledError(Exception):
     pass
 
 
+class CalculationCanceledError(Exception):
+    """Calculation was cancelled by the user."""
+    pass
+
+
 class LinkingFailed(Exception):
     """Unlinked exchanges remain after relinking."""
     pass
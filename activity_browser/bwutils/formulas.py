@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled evaluation of the parameter and exchange formulas of a project.
+
+All formulas are parsed once into a dependency-ordered graph, after which
+the graph can be evaluated for any number of parameter samples at the same
+time by using numpy arrays as the symbol values. When only a few parameters
+change, only the formulas that depend on them are evaluated again.
+"""
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Set
+
+from asteval import Interpreter
+from bw2data.parameters import get_new_symbols
+from bw2parameters.errors import MissingName, ParameterError
+import numpy as np
+
+from .utils import Parameters, StaticParameters
+
+
+class FormulaGraph(object):
+    """Dependency-ordered graph of all parameter and exchange formulas.
+
+    Every parameter is a node keyed on its (group, name), where the group
+    is 'project', the database name or the activity parameter group. Every
+    parameterized exchange is a node keyed on ('exchange', position), where
+    position is the index of the exchange in `ParameterManager.indices`.
+
+    Symbols in a formula are resolved in the same way as the parameter
+    manager does: first the own group, then the database and lastly the
+    project parameters.
+    """
+    def __init__(self, initial: StaticParameters, parameters: Parameters):
+        self.interpreter = Interpreter()
+        # Input nodes, in the same order as the parameters.
+        self.inputs: List[Hashable] = [(p.group, p.name) for p in parameters]
+        self.exchanges: List[Hashable] = []
+        # ParameterizedExchange.exchange ids, in the same order as `exchanges`.
+        self.exchange_ids: List[int] = []
+        # Activity parameter group of each exchange, in the same order as `exchanges`.
+        self.exchange_groups: List[str] = []
+        # node -> (parsed formula, {symbol: node})
+        self.formulas: Dict[Hashable, tuple] = {}
+        # node -> nodes with a formula using the node
+        self.dependents: Dict[Hashable, Set[Hashable]] = defaultdict(set)
+        self._build(initial)
+        self.order = self._sort()
+        # Values of all nodes and the parameter amounts at the last `update`.
+        self.values: Optional[dict] = None
+        self._amounts: Optional[np.ndarray] = None
+
+    def _add_formula(self, node: Hashable, formula: str, scopes: List[tuple]) -> None:
+        """Parse the formula and link each of its symbols to the node of
+        the first scope defining it.
+        """
+        links = {}
+        for symbol in get_new_symbols([formula]):
+            for group, names in scopes:
+                if symbol in names:
+                    links[symbol] = (group, symbol)
+                    break
+            else:
+                raise MissingName("The following variables aren't defined:\n{}".format(symbol))
+        self.formulas[node] = (self.interpreter.parse(formula), links)
+        for dependency in links.values():
+            self.dependents[dependency].add(node)
+
+    def _build(self, initial: StaticParameters) -> None:
+        project = initial.project()
+        project_scope = ("project", set(project))
+        for name, data in project.items():
+            if data.get("formula"):
+                self._add_formula(("project", name), data["formula"], [project_scope])
+
+        db_scopes = {}
+        for db in initial.databases:
+            data = initial.by_database(db)
+            db_scopes[db] = (db, set(data))
+            for name, param in data.items():
+                if param.get("formula"):
+                    self._add_formula((db, name), param["formula"], [db_scopes[db], project_scope])
+
+        for p in initial.act_by_group_db:
+            data = initial.act_by_group(p.group)
+            scopes = [(p.group, set(data)), db_scopes.get(p.database, (p.database, set())), project_scope]
+            for name, param in data.items():
+                if param.get("formula") and (p.group, name) not in self.formulas:
+                    self._add_formula((p.group, name), param["formula"], scopes)
+            for exc, formula in initial.exc_by_group(p.group).items():
+                node = ("exchange", len(self.exchanges))
+                self.exchanges.append(node)
+                self.exchange_ids.append(exc)
+                self.exchange_groups.append(p.group)
+                self._add_formula(node, formula, scopes)
+
+    def _sort(self) -> List[Hashable]:
+        """Return the formula nodes in an order where every node comes after
+        the nodes it depends on.
+        """
+        order, state = [], {}
+
+        def visit(node: Hashable) -> None:
+            if state.get(node) == "done" or node not in self.formulas:
+                return
+            if state.get(node) == "visiting":
+                raise ParameterError("Circular reference in the formula of '{}'".format(node[1]))
+            state[node] = "visiting"
+            for dependency in self.formulas[node][1].values():
+                visit(dependency)
+            state[node] = "done"
+            order.append(node)
+
+        for node in self.formulas:
+            visit(node)
+        return order
+
+    def affected(self, changed: Iterable[Hashable]) -> List[Hashable]:
+        """Return the formula nodes that have to be evaluated again when the
+        given nodes change, in evaluation order.
+        """
+        seen, stack = set(), list(changed)
+        while stack:
+            node = stack.pop()
+            if node not in seen:
+                seen.add(node)
+                stack.extend(self.dependents.get(node, ()))
+        return [node for node in self.order if node in seen]
+
+    def _run(self, parsed) -> float:
+        # The interpreter refuses to run while errors of a previous run remain.
+        self.interpreter.error = []
+        return self.interpreter.run(parsed)
+
+    def _evaluate(self, node: Hashable, values: dict, size: Optional[int]) -> np.ndarray:
+        """Evaluate the formula of the node for all samples at once. Formulas
+        that do not support array values are evaluated sample by sample.
+        """
+        parsed, links = self.formulas[node]
+        symbols = {symbol: values[dependency] for symbol, dependency in links.items()}
+        self.interpreter.symtable.update(symbols)
+        try:
+            result = np.asarray(self._run(parsed), dtype=np.float64)
+            return result if size is None else np.broadcast_to(result, (size,))
+        except Exception:
+            if size is None:
+                raise
+        result = np.empty(size)
+        for i in range(size):
+            self.interpreter.symtable.update({k: v[i] for k, v in symbols.items()})
+            result[i] = self._run(parsed)
+        return result
+
+    def evaluate(self, amounts: np.ndarray) -> np.ndarray:
+        """Evaluate all formulas for the given parameter amounts.
+
+        Parameters
+        ----------
+        amounts : np.ndarray
+            Amounts of the parameters, in the order of `inputs`. Either a
+            1-dimensional array, or a 2-dimensional array with one column
+            per sample.
+
+        Returns
+        -------
+        np.ndarray
+            Amounts of the parameterized exchanges, shaped as (exchanges,)
+            or (exchanges, samples).
+
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        size = amounts.shape[1] if amounts.ndim == 2 else None
+        values = dict(zip(self.inputs, amounts))
+        for node in self.order:
+            values[node] = self._evaluate(node, values, size)
+        return self._collect(values, amounts.shape[1:])
+
+    def _collect(self, values: dict, shape: tuple = ()) -> np.ndarray:
+        data = np.zeros((len(self.exchanges),) + shape)
+        for i, node in enumerate(self.exchanges):
+            data[i] = values[node]
+        return data
+
+    def update(self, amounts: np.ndarray) -> np.ndarray:
+        """Similar to `evaluate` for a single set of parameter amounts, but
+        only evaluates the formulas affected by the parameters whose amount
+        changed since the previous update.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if self.values is None:
+            self.values = dict(zip(self.inputs, amounts))
+            changed = list(self.formulas)
+        else:
+            positions = np.flatnonzero(self._amounts != amounts)
+            changed = [self.inputs[i] for i in positions]
+            self.values.update((self.inputs[i], amounts[i]) for i in positions)
+        self._amounts = amounts
+        for node in self.affected(changed):
+            self.values[node] = self._evaluate(node, self.values, None)
+        return self._collect(self.values)
@@ -3,20 +3,18 @@ from abc import abstractmethod
 from collections import defaultdict
 from collections.abc import Iterator
 import itertools
-from typing import Iterable, List, Optional, Tuple
+from typing import List, Optional
 
-from asteval import Interpreter
 from bw2calc import LCA
 from bw2data.backends.peewee import ExchangeDataset
 from bw2data.parameters import (
     ProjectParameter, DatabaseParameter, ActivityParameter,
-    ParameterizedExchange, get_new_symbols
+    ParameterizedExchange
 )
-from bw2parameters import ParameterSet
-from bw2parameters.errors import MissingName
 import numpy as np
 from stats_arrays import MCRandomNumberGenerator, UncertaintyBase
 
+from .formulas import FormulaGraph
 from .utils import Index, Parameters, Indices, StaticParameters
 
 
@@ -28,6 +26,7 @@ class ParameterManager(object):
         self.parameters: Parameters = Parameters.from_bw_parameters()
         self.initial: StaticParameters = StaticParameters()
         self.indices: Indices = self.construct_indices()
+        self.graph: FormulaGraph = FormulaGraph(self.initial, self.parameters)
 
     def construct_indices(self) -> Indices:
         """Given that ParameterizedExchanges will always have the same order of
@@ -42,113 +41,15 @@ class ParameterManager(object):
             )
         return indices
 
-    def recalculate_project_parameters(self) -> dict:
-        data = self.initial.project()
-        if not data:
-            return {}
-
-        new_values = self.parameters.data_by_group("project")
-
-        for name, amount in new_values.items():
-            data[name]["amount"] = amount
-
-        ParameterSet(data).evaluate_and_set_amount_field()
-        return StaticParameters.prune_result_data(data)
-
-    def recalculate_database_parameters(self, database: str, global_params: dict = None) -> dict:
-        data = self.initial.by_database(database)
-        if not data:
-            return {}
-
-        glo = global_params or {}
-        new_values = self.parameters.data_by_group(database)
-        for name, amount in new_values.items():
-            data[name]["amount"] = amount
-
-        new_symbols = get_new_symbols(data.values(), set(data))
-        missing = new_symbols.difference(glo)
-        if missing:
-            raise MissingName("The following variables aren't defined:\n{}".format("|".join(missing)))
-
-        glo = Parameters.static(glo, needed=new_symbols) if new_symbols else None
-
-        ParameterSet(data, glo).evaluate_and_set_amount_field()
-        return StaticParameters.prune_result_data(data)
-
-    def process_database_parameters(self, global_params: dict = None) -> dict:
-        glo = global_params or self.recalculate_project_parameters()
-        all_db = {}
-        for database in self.initial.databases:
-            db = self.recalculate_database_parameters(database, glo)
-            all_db[database] = {x: y for x, y in db.items()} if db else {}
-        return all_db
-
-    def recalculate_activity_parameters(self, group: str, global_params: dict = None) -> dict:
-        data = self.initial.act_by_group(group)
-        if not data:
-            return {}
-
-        new_values = self.parameters.data_by_group(group)
-        glo = global_params or {}
-        for name, amount in new_values.items():
-            data[name]["amount"] = amount
-
-        new_symbols = get_new_symbols(data.values(), set(data))
-        missing = new_symbols.difference(global_params)
-        if missing:
-            raise MissingName("The following variables aren't defined:\n{}".format("|".join(missing)))
-
-        glo = Parameters.static(glo, needed=new_symbols) if new_symbols else None
-
-        ParameterSet(data, glo).evaluate_and_set_amount_field()
-        return StaticParameters.prune_result_data(data)
-
-    def recalculate_exchanges(self, group: str, global_params: dict = None) -> Iterable[Tuple[int, float]]:
-        """ Constructs a list of exc.id/amount tuples for the
-        ParameterizedExchanges in the given group.
-        """
-        params = self.initial.exc_by_group(group)
-        if not params:
-            return []
-
-        glo = global_params or {}
-        interpreter = Interpreter()
-        interpreter.symtable.update(glo)
-        return [(k, interpreter(v)) for k, v in params.items()]
-
-    def process_exchanges(self, global_params: dict = None, db_params: dict = None,
-                          build_indices: bool = True) -> np.ndarray:
-        dbs = db_params or {}
-        complete_data = np.zeros(len(self.indices))
-
-        offset = 0
-        for p in self.initial.act_by_group_db:
-            combination = {x: y for x, y in global_params.items()} if global_params else {}
-            combination.update(dbs.get(p.database, {}))
-            combination.update(self.recalculate_activity_parameters(p.group, combination))
-
-            recalculated = self.recalculate_exchanges(p.group, global_params=combination)
-            # If the parameter group contains no ParameterizedExchanges, skip.
-            if not recalculated:
-                continue
-            # `data` contains the recalculated amounts for the exchanges.
-            _, data = zip(*recalculated)
-            complete_data[offset:len(data) + offset] = data
-            offset += len(data)
-
-        return complete_data
-
     def calculate(self) -> np.ndarray:
         """ Convenience function that takes calculates the current parameters
         and returns a fully-formed set of exchange amounts and indices.
 
-        All parameter types are recalculated in turn before interpreting the
-        ParameterizedExchange formulas into amounts.
+        The formulas are evaluated through the `FormulaGraph`, which parses
+        them only once and only evaluates the formulas affected by parameters
+        that changed since the previous calculation.
         """
-        global_project = self.recalculate_project_parameters()
-        all_db = self.process_database_parameters(global_project)
-        data = self.process_exchanges(global_project, all_db)
-        return data
+        return self.graph.update([p.amount for p in self.parameters])
 
     @abstractmethod
     def recalculate(self, values: List[float]) -> np.ndarray:
@@ -206,19 +107,16 @@ class ParameterManager(object):
         return ParameterizedExchange.select().exists()
 
     def parameter_exchange_dependencies(self) -> dict:
-        """
+        """Build a dictionary of the exchanges directly using each parameter,
+        taken from the `FormulaGraph`.
 
         Schema: {param1: List[tuple], param2: List[tuple]}
         """
         parameters = defaultdict(list)
-        for act in self.initial.act_by_group_db:
-            exchanges = self.initial.exc_by_group(act.group)
-            for exc, formula in exchanges.items():
-                params = get_new_symbols([formula])
-                # Convert exchange from int to Index
-                exc = Index.build_from_exchange(ExchangeDataset.get_by_id(exc))
-                for param in params:
-                    parameters[param].append(exc)
+        for i, node in enumerate(self.graph.exchanges):
+            _, links = self.graph.formulas[node]
+            for param in links:
+                parameters[param].append(self.indices[i])
         return parameters
 
     def extract_active_parameters(self, lca: LCA) -> dict:
@@ -305,29 +203,33 @@ class MonteCarloParameterManager(ParameterManager, Iterator):
         assert iterations > 0, "Must have a positive amount of iterations"
         if iterations == 1:
             return self.next()
-        # Construct indices, prepare sized array and sample parameter
-        # uncertainty distributions `interations` times.
-        all_data = np.empty((iterations, len(self.indices)), dtype=Indices.array_dtype)
+        # Sample the parameter uncertainty distributions `iterations` times,
+        # not-sampled (NaN) values keep the current amount of the parameter.
         random_bounded_values = self.mc_generator.generate(iterations)
+        current = np.array([p.amount for p in self.parameters], dtype=np.float64)
+        amounts = np.where(np.isnan(random_bounded_values), current[:, np.newaxis], random_bounded_values)
+        self.parameters.update(random_bounded_values.take(-1, axis=1))
 
-        # Now, repeatedly replace parameter amounts with sampled data and
-        # recalculate. Every processed row is added to the sized array.
-        for i in range(iterations):
-            values = random_bounded_values.take(i, axis=1)
-            self.parameters.update(values)
-            data = self.calculate()
-            all_data[i] = self.indices.mock_params(data)
-
+        # Recalculate all of the iterations in a single pass over the formulas.
+        data = self.graph.evaluate(amounts)
+        all_data = np.empty((iterations, len(self.indices)), dtype=Indices.array_dtype)
+        all_data[:] = self.indices.mock_params(np.zeros(len(self.indices)))
+        all_data["amount"] = data.T
         return all_data
 
     def next(self) -> np.ndarray:
         """Similar to `recalculate` but only performs a single sampling and
         recalculation.
         """
+        return self.indices.mock_params(self.next_values())
+
+    def next_values(self) -> np.ndarray:
+        """Performs a single sampling and recalculation, returning only the
+        amounts of the parameterized exchanges in the order of `indices`.
+        """
         values = self.mc_generator.next()
         self.parameters.update(values)
-        data = self.calculate()
-        return self.indices.mock_params(data)
+        return self.calculate()
 
     def retrieve_sampled_values(self, data: dict):
         """Enters the sampled values into the 'exchanges' list in the 'data'
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import copy
 from time import time
 from typing import Optional, Union
 
@@ -6,15 +7,28 @@ import brightway2 as bw
 from bw2calc.utils import get_seed
 import numpy as np
 import pandas as pd
+from scipy import sparse
 from stats_arrays import MCRandomNumberGenerator
 from collections import defaultdict
+from itertools import repeat
 
+from .characterization import characterization_cache
 from .manager import MonteCarloParameterManager
+from .solvers import (
+    IterativeSolver, build_demand_matrix, factorize_technosphere, iterative_solver, solve_demand_matrix
+)
+from .streaming import RunningStatistics, SampleStore
+from .workers import process_pool, split_work, worker_seeds
 
 
 class MonteCarloLCA(object):
-    """A Monte Carlo LCA for multiple reference flows and methods loaded from a calculation setup."""
-    def __init__(self, cs_name):
+    """A Monte Carlo LCA for multiple reference flows and methods loaded from a calculation setup.
+
+    The inventory data can be borrowed from the (already loaded) LCA object
+    of an MLCA of the same calculation setup, through `shared_lca`, instead
+    of being loaded from disk again.
+    """
+    def __init__(self, cs_name, shared_lca: Optional[bw.LCA] = None):
         if cs_name not in bw.calculation_setups:
             raise ValueError(
                 "{} is not a known `calculation_setup`.".format(cs_name)
@@ -24,6 +38,9 @@ class MonteCarloLCA(object):
         self.cs = bw.calculation_setups[cs_name]
         self.seed = None
         self.cf_rngs = {}
+        self.cf_params = {}
+        self.demand_matrix: Optional[np.ndarray] = None
+        self.iterative_solver: Optional[IterativeSolver] = None
         self.CF_rng_vectors = {}
         self.include_technosphere = True
         self.include_biosphere = True
@@ -31,6 +48,15 @@ class MonteCarloLCA(object):
         self.include_parameters = True
         self.param_rng = None
         self.param_cols = ["row", "col", "type"]
+        self.param_index_map = {}
+
+        # Streaming mode: samples and scores are written to disk instead of
+        # keeping all of the sampled matrices in memory.
+        self.store: Optional[SampleStore] = None
+        self.store_offset = 0
+        self.sample_positions = {}
+        self.static_vectors = {}
+        self.statistics: Optional[RunningStatistics] = None
 
         self.tech_rng: Optional[Union[MCRandomNumberGenerator, np.ndarray]] = None
         self.bio_rng: Optional[Union[MCRandomNumberGenerator, np.ndarray]] = None
@@ -76,6 +102,24 @@ class MonteCarloLCA(object):
         self.results = list()
 
         self.lca = bw.LCA(demand=self.func_units_dict, method=self.methods[0])
+        self.shared_lca = shared_lca
+
+    def param_rowcol(self, x) -> Optional[tuple]:
+        """Convert a parameterized exchange from input/output keys into
+        row/col values using dicts generated in bw.LCA object.
+
+        Returns None if the exchange does not exist in the current LCA matrix.
+        """
+        if x["type"] in [0, 1]:
+            row = self.lca.activity_dict.get(x["input"], None)
+            col = self.lca.product_dict.get(x["output"], None)
+        else:
+            row = self.lca.biosphere_dict.get(x["input"], None)
+            col = self.lca.activity_dict.get(x["output"], None)
+        # if either the row or the column is None, return np.NaN.
+        if row is None or col is None:
+            return None
+        return row, col, x["type"], x["amount"]
 
     def unify_param_exchanges(self, data: np.ndarray) -> np.ndarray:
         """Convert an array of parameterized exchanges from input/output keys
@@ -84,25 +128,35 @@ class MonteCarloLCA(object):
         If any given exchange does not exist in the current LCA matrix,
         it will be dropped from the returned array.
         """
-        def key_to_rowcol(x) -> Optional[tuple]:
-            if x["type"] in [0, 1]:
-                row = self.lca.activity_dict.get(x["input"], None)
-                col = self.lca.product_dict.get(x["output"], None)
-            else:
-                row = self.lca.biosphere_dict.get(x["input"], None)
-                col = self.lca.activity_dict.get(x["output"], None)
-            # if either the row or the column is None, return np.NaN.
-            if row is None or col is None:
-                return None
-            return row, col, x["type"], x["amount"]
-
         # Convert the data and store in a new array, dropping Nones.
-        converted = (key_to_rowcol(d) for d in data)
+        converted = (self.param_rowcol(d) for d in data)
         unified = np.array([x for x in converted if x is not None], dtype=[
             ('row', '<u4'), ('col', '<u4'), ('type', 'u1'), ('amount', '<f4')
         ])
         return unified
 
+    def build_param_index_map(self) -> None:
+        """Match the parameterized exchanges against the `tech_params` and
+        `bio_params` arrays once.
+
+        The positions of the exchanges never change between iterations, so
+        the recalculated amounts can then be inserted into the sampled
+        vectors with a single fancy-index assignment.
+        """
+        data = self.param_rng.indices.mock_params(np.zeros(len(self.param_rng.indices)))
+        converted = [self.param_rowcol(d) for d in data]
+        # Positions in the `indices` of the exchanges present in the LCA matrices.
+        self.param_sources = np.array([i for i, x in enumerate(converted) if x is not None], dtype=int)
+        self.param_exchanges_template = self.unify_param_exchanges(data)
+
+        self.param_index_map = {}
+        for kind, params, types in [("technosphere", self.lca.tech_params, [0, 1]),
+                                    ("biosphere", self.lca.bio_params, [2])]:
+            mask = np.isin(self.param_exchanges_template["type"], types)
+            positions, matches = match_exchanges(params, self.param_exchanges_template[mask])
+            # vector[positions] = amounts[sources]
+            self.param_index_map[kind] = (positions, self.param_sources[mask][matches])
+
     def load_data(self) -> None:
         """Constructs the random number generators for all of the matrices that
         can be altered by uncertainty.
@@ -111,7 +165,14 @@ class MonteCarloLCA(object):
         amounts of the 'params' matrices are used in place of generating
         a vector
         """
-        self.lca.load_lci_data()
+        if self.shared_lca is not None:
+            # The matrices are rebuilt in every iteration, so a shallow copy
+            # of the shared LCA object is enough to leave it untouched.
+            self.lca = copy.copy(self.shared_lca)
+            if hasattr(self.lca, "solver"):
+                delattr(self.lca, "solver")
+        else:
+            self.lca.load_lci_data()
 
         self.tech_rng = MCRandomNumberGenerator(self.lca.tech_params, seed=self.seed) \
             if self.include_technosphere else self.lca.tech_params["amount"].copy()
@@ -120,20 +181,54 @@ class MonteCarloLCA(object):
 
         if self.lca.lcia:
             self.cf_rngs = {}  # we need as many cf_rng as impact categories, because they are of different size
+            self.cf_params = {}
             for m in self.methods:
-                self.lca.switch_method(m)
-                self.lca.load_lcia_data()
+                characterization_cache.load(self.lca, m)
+                self.cf_params[m] = self.lca.cf_params
                 self.cf_rngs[m] = MCRandomNumberGenerator(self.lca.cf_params, seed=self.seed) \
                     if self.include_cfs else self.lca.cf_params["amount"].copy()
+        # Demand of all reference flows, solved together in every iteration.
+        self.demand_matrix = build_demand_matrix(self.lca, self.func_units)
         # Construct the MC parameter manager
         if self.include_parameters:
             self.param_rng = MonteCarloParameterManager(seed=self.seed)
+            self.build_param_index_map()
+        if self.store is not None:
+            self.sample_positions = {
+                "technosphere": self.varying_positions("technosphere", self.lca.tech_params, self.include_technosphere),
+                "biosphere": self.varying_positions("biosphere", self.lca.bio_params, self.include_biosphere),
+            }
 
         self.lca.activity_dict_rev, self.lca.product_dict_rev, self.lca.biosphere_dict_rev = self.lca.reverse_dict()
 
-    def calculate(self, iterations=10, seed: int = None, **kwargs):
+    def varying_positions(self, kind: str, params: np.ndarray, uncertain: bool) -> np.ndarray:
+        """Return the positions in the given params array of the exchanges
+        that can change between iterations, these are the only exchanges
+        that are stored in streaming mode.
+        """
+        # Uncertainty types 0 and 1 are 'undefined' and 'no uncertainty'.
+        mask = params["uncertainty_type"] > 1 if uncertain else np.zeros(len(params), dtype=bool)
+        if self.include_parameters:
+            mask[self.param_index_map[kind][0]] = True
+        return np.flatnonzero(mask)
+
+    def calculate(self, iterations=10, seed: int = None, workers: int = 1, streaming: bool = False, **kwargs):
         """Main calculate method for the MC LCA class, allows fine-grained control
         over which uncertainties are included when running MC sampling.
+
+        If more than one worker is given, the iterations are split over that
+        many worker processes. Each worker uses a seed derived from the given
+        seed, so results are reproducible for the same seed and number
+        of workers.
+
+        In streaming mode the scores and the samples of the uncertain
+        exchanges and CFs are written to memory-mapped files on disk,
+        instead of keeping the sampled matrices in memory.
+
+        The technosphere of every iteration is factorized, unless an
+        iterative 'solver' ('bicgstab' or 'gmres') is given, which starts
+        from the supply of the previous iteration and converges to the
+        relative tolerance 'tol'.
         """
         start = time()
         self.iterations = iterations
@@ -142,10 +237,45 @@ class MonteCarloLCA(object):
         self.include_biosphere = kwargs.get("biosphere", True)
         self.include_cfs = kwargs.get("cf", True)
         self.include_parameters = kwargs.get("parameters", True)
+        self.iterative_solver = iterative_solver(kwargs.get("solver", "direct"), kwargs.get("tol", 1e-8))
+        # Worker processes write into the store of the parent process.
+        self.store = SampleStore(kwargs.get("store")) if streaming else None
+        self.store_offset = kwargs.get("offset", 0)
+
+        if workers > 1:
+            self._calculate_parallel(iterations, workers, streaming=streaming, **kwargs)
+        else:
+            self._calculate(iterations)
+        if self.store is not None:
+            self.store.flush()
 
+        print('Monte Carlo LCA: finished {} iterations for {} reference flows and {} methods in {} seconds.'.format(
+            iterations,
+            len(self.func_units),
+            len(self.methods),
+            np.round(time() - start, 2)
+        ))
+
+    def create_store_arrays(self, iterations: int) -> None:
+        """Create the on-disk arrays for the scores and samples."""
+        self.store.create("results", (iterations, len(self.func_units), len(self.methods)))
+        for kind, positions in self.sample_positions.items():
+            self.store.create(kind, (iterations, positions.size))
+        for i, m in self.rev_method_index.items():
+            self.store.create("cf_{}".format(i), (iterations, len(self.cf_params[m])))
+
+    def _calculate(self, iterations: int) -> None:
+        """Perform the Monte Carlo iterations in the current process."""
         self.load_data()
 
-        self.results = np.zeros((iterations, len(self.func_units), len(self.methods)))
+        self.statistics = RunningStatistics((len(self.func_units), len(self.methods)))
+        if self.store is None:
+            self.results = np.zeros((iterations, len(self.func_units), len(self.methods)))
+        else:
+            if "results" not in self.store:
+                self.create_store_arrays(iterations)
+            self.results = self.store["results"]
+        offset = self.store_offset
 
         # Reset GSA variables to empty.
         self.A_matrices = list()
@@ -153,6 +283,9 @@ class MonteCarloLCA(object):
         self.CF_dict = defaultdict(list)
         self.parameter_exchanges = list()
         self.parameters = list()
+        self.static_vectors = {}
+        if self.store is not None:
+            self.CF_dict.update({m: self.store["cf_{}".format(i)] for i, m in self.rev_method_index.items()})
 
         # Prepare GSA parameter schema:
         if self.include_parameters:
@@ -165,33 +298,14 @@ class MonteCarloLCA(object):
             tech_vector = self.tech_rng.next() if self.include_technosphere else self.tech_rng
             bio_vector = self.bio_rng.next() if self.include_biosphere else self.bio_rng
             if self.include_parameters:
-                # Convert the input/output keys into row/col keys, and then match them against
-                # the tech_ and bio_params
-                data = self.param_rng.next()
-                param_exchanges = self.unify_param_exchanges(data)
-
-                # Select technosphere subset from param_exchanges.
-                subset = param_exchanges[np.isin(param_exchanges["type"], [0, 1])]
-                # Create index of where to insert new values from tech_params array.
-                idx = np.argwhere(
-                    np.isin(self.lca.tech_params[self.param_cols], subset[self.param_cols])
-                ).flatten()
-                # Construct unique array of row+col+type combinations
-                uniq = np.unique(self.lca.tech_params[idx][self.param_cols])
-                # Use the unique array to sort the subset (ensures values
-                # are inserted at the correct index)
-                sort_idx = np.searchsorted(uniq, subset[self.param_cols])
-                # Finally, insert the sorted subset amounts into the tech_vector
-                # at the correct indexes.
-                tech_vector[idx] = subset[sort_idx]["amount"]
-                # Repeat the above, but for the biosphere array.
-                subset = param_exchanges[param_exchanges["type"] == 2]
-                idx = np.argwhere(
-                    np.isin(self.lca.bio_params[self.param_cols], subset[self.param_cols])
-                ).flatten()
-                uniq = np.unique(self.lca.bio_params[idx][self.param_cols])
-                sort_idx = np.searchsorted(uniq, subset[self.param_cols])
-                bio_vector[idx] = subset[sort_idx]["amount"]
+                # Insert the recalculated amounts at the precomputed positions.
+                amounts = self.param_rng.next_values()
+                positions, sources = self.param_index_map["technosphere"]
+                tech_vector[positions] = amounts[sources]
+                positions, sources = self.param_index_map["biosphere"]
+                bio_vector[positions] = amounts[sources]
+                param_exchanges = self.param_exchanges_template.copy()
+                param_exchanges["amount"] = amounts[self.param_sources]
 
                 # Store parameter data for GSA
                 self.parameter_exchanges.append(param_exchanges)
@@ -202,38 +316,143 @@ class MonteCarloLCA(object):
             self.lca.rebuild_technosphere_matrix(tech_vector)
             self.lca.rebuild_biosphere_matrix(bio_vector)
 
-            # store matrices for GSA
-            self.A_matrices.append(self.lca.technosphere_matrix)
-            self.B_matrices.append(self.lca.biosphere_matrix)
-
-            if not hasattr(self.lca, "demand_array"):
-                self.lca.build_demand_array()
-            self.lca.lci_calculation()
+            # store matrices for GSA, or only the varying exchanges when streaming
+            if self.store is None:
+                self.A_matrices.append(self.lca.technosphere_matrix)
+                self.B_matrices.append(self.lca.biosphere_matrix)
+            else:
+                self.store_vectors(offset + iteration, technosphere=tech_vector, biosphere=bio_vector)
 
             # pre-calculating CF vectors enables the use of the SAME CF vector for each FU in a given run
             cf_vectors = {}
             for m in self.methods:
                 cf_vectors[m] = self.cf_rngs[m].next() if self.include_cfs else self.cf_rngs[m]
-                # store CFs for GSA (in a list defaultdict)
-                self.CF_dict[m].append(cf_vectors[m])
-
-            # iterate over FUs
-            for row, func_unit in self.rev_fu_index.items():
-                self.lca.redo_lci(func_unit)  # lca calculation
+                # store CFs for GSA (in a list defaultdict, or on disk when streaming)
+                if self.store is None:
+                    self.CF_dict[m].append(cf_vectors[m])
+                else:
+                    self.CF_dict[m][offset + iteration] = cf_vectors[m]
+
+            # Factorize the new technosphere once and solve all reference flows together,
+            # then score all methods with a single product over the stacked CFs.
+            if self.iterative_solver is not None:
+                supply = self.iterative_solver.solve(self.lca.technosphere_matrix, self.demand_matrix)
+            else:
+                factorize_technosphere(self.lca)
+                supply = solve_demand_matrix(self.lca, self.demand_matrix)
+            inventory = self.lca.biosphere_matrix @ supply
+            self.results[offset + iteration] = (self.stack_cf_vectors(cf_vectors) @ inventory).T
+            self.statistics.update(self.results[offset + iteration])
+
+    def store_vectors(self, iteration: int, **vectors) -> None:
+        """Write the varying values of the sampled vectors to the store, the
+        values of the remaining exchanges are kept from the first iteration.
+        """
+        for kind, vector in vectors.items():
+            if kind not in self.static_vectors:
+                self.static_vectors[kind] = vector.copy()
+            self.store[kind][iteration] = vector[self.sample_positions[kind]]
 
-                # iterate over methods
-                for col, m in self.rev_method_index.items():
-                    self.lca.switch_method(m)
-                    self.lca.rebuild_characterization_matrix(cf_vectors[m])
-                    self.lca.lcia_calculation()
-                    self.results[iteration, row, col] = self.lca.score
+    def _calculate_parallel(self, iterations: int, workers: int, streaming: bool = False, **kwargs) -> None:
+        """Split the iterations over worker processes and merge the results
+        and GSA data of the workers in a fixed order.
 
-        print('Monte Carlo LCA: finished {} iterations for {} reference flows and {} methods in {} seconds.'.format(
-            iterations,
-            len(self.func_units),
-            len(self.methods),
-            np.round(time() - start, 2)
-        ))
+        When streaming, the workers write into the store of this process.
+        """
+        chunks = [len(chunk) for chunk in split_work(iterations, workers)]
+        seeds = worker_seeds(self.seed, workers)[:len(chunks)]
+        if streaming:
+            self.load_data()
+            self.create_store_arrays(iterations)
+            offsets = np.cumsum([0] + chunks[:-1])
+            kwargs = [dict(kwargs, store=self.store.directory, offset=int(o)) for o in offsets]
+        else:
+            kwargs = repeat(kwargs)
+        with process_pool(len(chunks)) as pool:
+            parts = list(pool.map(_calculate_chunk, repeat(self.cs_name), chunks, seeds, kwargs, repeat(streaming)))
+
+        self.A_matrices = [m for part in parts for m in part["A_matrices"]]
+        self.B_matrices = [m for part in parts for m in part["B_matrices"]]
+        self.CF_dict = defaultdict(list)
+        if streaming:
+            self.results = self.store["results"]
+            self.CF_dict.update({m: self.store["cf_{}".format(i)] for i, m in self.rev_method_index.items()})
+            self.static_vectors = parts[0]["static_vectors"]
+        else:
+            self.results = np.concatenate([part["results"] for part in parts])
+            for part in parts:
+                for m, vectors in part["CF_dict"].items():
+                    self.CF_dict[m].extend(vectors)
+        self.statistics = RunningStatistics.from_samples(self.results)
+        self.parameter_exchanges = [e for part in parts for e in part["parameter_exchanges"]]
+        self.parameters = [p for part in parts for p in part["parameters"]]
+        self.parameter_data = parts[0]["parameter_data"]
+        for part in parts[1:]:
+            for key, data in part["parameter_data"].items():
+                self.parameter_data[key]["values"].extend(data["values"])
+
+    def gsa_data(self) -> dict:
+        """Return the results and all sampled data required for GSA.
+
+        When streaming, the results and samples are left out as they
+        are already stored on disk.
+        """
+        streaming = self.store is not None
+        return {
+            "results": None if streaming else self.results,
+            "A_matrices": self.A_matrices,
+            "B_matrices": self.B_matrices,
+            "CF_dict": {} if streaming else dict(self.CF_dict),
+            "static_vectors": self.static_vectors,
+            "parameter_exchanges": self.parameter_exchanges,
+            "parameters": self.parameters,
+            "parameter_data": self.parameter_data,
+        }
+
+    def get_exchange_samples(self, indices: list, biosphere: bool = False) -> np.ndarray:
+        """Reconstruct the sampled matrix values at the given (row, col)
+        indices from the stored samples, returns an array of shape
+        (iterations, indices).
+
+        This is the streaming counterpart of reading the values from the
+        `A_matrices` and `B_matrices`.
+        """
+        if not len(indices):
+            return np.zeros((self.iterations, 0))
+        kind = "biosphere" if biosphere else "technosphere"
+        params = self.lca.bio_params if biosphere else self.lca.tech_params
+        # Technosphere inputs are negative in the matrix, see `fix_supply_use`.
+        signs = np.ones(len(params))
+        if not biosphere:
+            signs[params["type"] == 1] = -1
+
+        # Map every exchange in the params array to the index it adds up to.
+        matrix = self.lca.biosphere_matrix if biosphere else self.lca.technosphere_matrix
+        width = matrix.shape[1]
+        rows, cols = np.asarray(indices, dtype=np.int64).reshape(-1, 2).T
+        wanted, inverse = np.unique(rows * width + cols, return_inverse=True)
+        keys = params["row"].astype(np.int64) * width + params["col"]
+        found = np.minimum(np.searchsorted(wanted, keys), len(wanted) - 1)
+        match = np.flatnonzero(wanted[found] == keys)
+        mapping = sparse.csr_matrix(
+            (signs[match], (match, found[match])), shape=(len(params), len(wanted))
+        )
+
+        positions = self.sample_positions[kind]
+        static = self.static_vectors[kind].copy()
+        static[positions] = 0
+        values = self.store[kind] @ mapping[positions] + static @ mapping
+        return np.asarray(values)[:, inverse]
+
+    def stack_cf_vectors(self, cf_vectors: dict) -> np.ndarray:
+        """Combine the sampled CF vectors of all methods into a single dense
+        array of shape (methods, biosphere flows).
+        """
+        cfs = np.zeros((len(self.methods), len(self.lca.biosphere_dict)))
+        for col, m in self.rev_method_index.items():
+            # Duplicate flows are summed, same as building the sparse matrix.
+            np.add.at(cfs[col], self.cf_params[m]["row"], cf_vectors[m])
+        return cfs
 
     @property
     def func_units_dict(self) -> dict:
@@ -299,6 +518,20 @@ class MonteCarloLCA(object):
 
         return df
 
+    def get_statistics_dataframe(self, method, labelled=True) -> pd.DataFrame:
+        """Return a Pandas DataFrame with the running statistics of the
+        results of all reference flows for the given impact category.
+        """
+        if self.statistics is None:
+            raise ValueError('You need to perform a Monte Carlo Simulation first.')
+
+        col = self.method_index[method]
+        stats = self.statistics
+        data = {"mean": stats.mean[:, col], "std": stats.std[:, col]}
+        data.update({"{:g}%".format(p * 100): stats.quantile(p)[:, col] for p in stats.quantiles})
+        index = self.get_labels(self.activity_keys) if labelled else self.activity_keys
+        return pd.DataFrame(data, index=index)
+
     @staticmethod
     def get_labels(key_list, fields: list = None, separator=' | ',
                    max_length: int = None) -> list:
@@ -314,6 +547,36 @@ class MonteCarloLCA(object):
         return translated_keys
 
 
+def match_exchanges(params: np.ndarray, exchanges: np.ndarray) -> tuple:
+    """Find the positions in the `params` array with the same row, col and
+    type as one of the given exchanges.
+
+    Returns the positions and, for each position, the index of the
+    matching exchange.
+    """
+    if not len(exchanges):
+        return np.array([], dtype=int), np.array([], dtype=int)
+    # Encode (row, col, type) as a single integer to match on.
+    width = int(max(params["col"].max(initial=0), exchanges["col"].max())) + 1
+
+    def encode(x: np.ndarray) -> np.ndarray:
+        return (x["row"].astype(np.int64) * width + x["col"]) * 256 + x["type"]
+
+    codes = encode(exchanges)
+    order = np.argsort(codes, kind="stable")
+    targets = encode(params)
+    found = np.minimum(np.searchsorted(codes[order], targets), len(codes) - 1)
+    positions = np.flatnonzero(codes[order][found] == targets)
+    return positions, order[found[positions]]
+
+
+def _calculate_chunk(cs_name: str, iterations: int, seed: int, kwargs: dict, streaming: bool = False) -> dict:
+    """Run part of the Monte Carlo iterations inside a worker process."""
+    mc = MonteCarloLCA(cs_name)
+    mc.calculate(iterations=iterations, seed=seed, streaming=streaming, **kwargs)
+    return mc.gsa_data()
+
+
 def perform_MonteCarlo_LCA(project='default', cs_name=None, iterations=10):
     """Performs Monte Carlo LCA based on a calculation setup and returns the
     Monte Carlo LCA object."""
@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
-from typing import Iterable, Optional, Union
-from PySide2.QtWidgets import QMessageBox, QApplication
+from collections import OrderedDict
+import copy
+from typing import Callable, Hashable, Iterable, Optional, Union
 import numpy as np
 import pandas as pd
+from scipy import sparse
 import brightway2 as bw
 from bw2analyzer import ContributionAnalysis
 
@@ -11,6 +13,50 @@ ca = ContributionAnalysis()
 from .commontasks import wrap_text
 from .metadata import AB_metadata
 from .errors import ReferenceFlowValueError
+from .characterization import characterization_cache
+from .solvers import (
+    build_demand_matrix, factorize_technosphere, iterative_solver, solve_demand_matrix
+)
+from .storage import ContributionStorage
+
+
+class LazyMatrixCache(object):
+    """Dict-like accessor which computes sparse result matrices on demand.
+
+    Only the `maxsize` most recently requested matrices are kept in memory,
+    older results are dropped and recomputed by `func` when requested again.
+
+    Parameters
+    ----------
+    func : callable
+        Takes a key and returns the matrix belonging to that key
+    maxsize : int
+        Number of results to keep in the cache
+
+    """
+    def __init__(self, func: Callable, maxsize: int = 32):
+        self.func = func
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+
+    def __getitem__(self, key: Hashable):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        value = self.func(key)
+        self._cache[key] = value
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._cache
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def clear(self) -> None:
+        self._cache.clear()
 
 
 class MLCA(object):
@@ -33,6 +79,18 @@ class MLCA(object):
     ----------
     cs_name : str
         Name of the calculation setup
+    storage : str
+        Storage backend of the contribution arrays, see `ContributionStorage`
+    top_n : int, optional
+        Number of contributions to keep per row for the 'sparse' storage
+    solver : str
+        'direct' to factorize the technosphere matrix, or 'bicgstab' or
+        'gmres' to use an `IterativeSolver`, see `iterative_solver`
+    tol : float
+        Relative tolerance of the iterative solver
+    progress : callable, optional
+        Called with the number of completed and total steps while loading
+        the data and calculating, see `calculate`
 
     Attributes
     ----------
@@ -59,6 +117,9 @@ class MLCA(object):
         calculations
     method_matrices: list
         Contains the characterization matrix for each impact category.
+    characterization_factors: `numpy.ndarray`
+        2-dimensional array of shape (`methods`, `biosphere`) holding the
+        diagonals of all characterization matrices stacked together
     lca_scores: `numpy.ndarray`
         2-dimensional array of shape (`func_units`, `methods`) holding the
         calculated LCA scores of each combination of reference flow and
@@ -75,16 +136,17 @@ class MLCA(object):
         Contains the calculated technosphere flows per reference flow
     inventory: dict
         Life cycle inventory (biosphere flows) per reference flow
-    inventories: dict
-        Biosphere flows per reference flow and impact category combination
-    characterized_inventories: dict
+    inventories: `LazyMatrixCache`
+        Biosphere flows per reference flow, computed on demand from the
+        scaling factors
+    characterized_inventories: `LazyMatrixCache`
         Inventory multiplied by scaling (relative impact on environment) per
-        reference flow and impact category combination
-    elementary_flow_contributions: `numpy.ndarray`
+        reference flow and impact category combination, computed on demand
+    elementary_flow_contributions: `ContributionStorage`
         3-dimensional array of shape (`func_units`, `methods`, `biosphere`)
         which holds the characterized inventory results summed along the
         technosphere axis
-    process_contributions: `numpy.ndarray`
+    process_contributions: `ContributionStorage`
         3-dimensional array of shape (`func_units`, `methods`, `technosphere`)
         which holds the characterized inventory results summed along the
         biosphere axis
@@ -102,7 +164,15 @@ class MLCA(object):
         If the given `cs_name` cannot be found in brightway calculation_setups
 
     """
-    def __init__(self, cs_name: str):
+    # Number of (characterized) inventory matrices kept in memory.
+    INVENTORY_CACHE_SIZE = 32
+    # Progress steps for loading the data and for solving the technosphere.
+    LOAD_STEPS = 2
+    SOLVE_STEPS = 2
+
+    def __init__(self, cs_name: str, storage: str = "float64", top_n: Optional[int] = None,
+                 solver: str = "direct", tol: float = 1e-8,
+                 progress: Optional[Callable[[int, int], None]] = None):
         try:
             cs = bw.calculation_setups[cs_name]
         except KeyError:
@@ -111,15 +181,11 @@ class MLCA(object):
             )
 
         if sum([v for rf in cs['inv'] for v in rf.values()]) == 0:
-            msg = QMessageBox()
-            msg.setText('Sum of reference flows equals 0')
-            msg.setInformativeText('A value greater than 0 must be provided for at least one reference flow.\n' +
-                                   'Please enter a valid value before calculating LCA results again.')
-            msg.setIcon(QMessageBox.Warning)
-            QApplication.restoreOverrideCursor()
-            msg.exec_()
+            # The calculation may run outside of the GUI thread, the warning
+            # is shown by the LCA results tab.
             raise ReferenceFlowValueError("Sum of reference flows == 0")
 
+        self.cs_name = cs_name
         # reference flows and related indexes
         self.func_units = cs['inv']
         self.fu_activity_keys = [list(fu.keys())[0] for fu in self.func_units]
@@ -131,13 +197,27 @@ class MLCA(object):
         self.method_index = {m: i for i, m in enumerate(self.methods)}
         self.rev_method_index = {v: k for k, v in self.method_index.items()}
 
+        # Reports the progress of the construction and `calculate`, if given.
+        self.progress = progress
+        self._progress_done = 0
+
         # initial LCA and prepare method matrices
         self.lca = self._construct_lca()
-        self.lca.lci(factorize=True)
+        self.lca.load_lci_data()
+        self._advance_progress()
+        self.lca.build_demand_array()
+        # Number of times the technosphere matrix has been factorized, this
+        # only happens once the technosphere is solved.
+        self.factorizations = 0
+        self.solver = solver
+        self.tol = tol
+        self.iterative_solver = iterative_solver(solver, tol)
         self.method_matrices = []
         for method in self.methods:
-            self.lca.switch_method(method)
+            characterization_cache.load(self.lca, method)
             self.method_matrices.append(self.lca.characterization_matrix)
+        self.characterization_factors = self._stack_method_matrices()
+        self._advance_progress()
 
         self.lca_scores = np.zeros((len(self.func_units), len(self.methods)))
 
@@ -152,15 +232,21 @@ class MLCA(object):
         # Life cycle inventory (biosphere flows) by reference flow
         self.inventory = dict()
         # Inventory (biosphere flows) for specific reference flow (e.g. 2000x15000) and impact category.
-        self.inventories = dict()
+        self.inventories = LazyMatrixCache(self._inventory_matrix, self.INVENTORY_CACHE_SIZE)
         # Inventory multiplied by scaling (relative impact on environment) per impact category.
-        self.characterized_inventories = dict()
+        self.characterized_inventories = LazyMatrixCache(
+            self._characterized_inventory_matrix, self.INVENTORY_CACHE_SIZE
+        )
 
         # Summarized contributions for EF and processes.
-        self.elementary_flow_contributions = np.zeros(
-            (len(self.func_units), len(self.methods), self.lca.biosphere_matrix.shape[0]))
-        self.process_contributions = np.zeros(
-            (len(self.func_units), len(self.methods), self.lca.technosphere_matrix.shape[0]))
+        self.storage = storage
+        self.top_n = top_n
+        self.elementary_flow_contributions = ContributionStorage(
+            (len(self.func_units), len(self.methods), self.lca.biosphere_matrix.shape[0]),
+            self.storage, self.top_n)
+        self.process_contributions = ContributionStorage(
+            (len(self.func_units), len(self.methods), self.lca.technosphere_matrix.shape[0]),
+            self.storage, self.top_n)
 
         # TODO: get rid of the below
         self.func_unit_translation_dict = {
@@ -177,45 +263,190 @@ class MLCA(object):
     def _construct_lca(self):
         return bw.LCA(demand=self.func_units_dict, method=self.methods[0])
 
+    def _factorize(self) -> None:
+        """Factorize the technosphere matrix of the LCA object."""
+        factorize_technosphere(self.lca)
+        self.factorizations += 1
+
+    def _solve_func_units(self) -> (np.ndarray, np.ndarray):
+        """Solve the technosphere for all reference flows at once.
+
+        A dense demand matrix with one column per reference flow is solved
+        with a single multi right-hand side call, reusing the factorized
+        technosphere matrix. With an iterative solver, the solution of the
+        previous call is used as the starting point instead.
+
+        Returns
+        -------
+        supply : `numpy.ndarray`
+            2-dimensional array of shape (`technosphere`, `func_units`)
+            holding the scaling factors per reference flow
+        inventory : `numpy.ndarray`
+            2-dimensional array of shape (`biosphere`, `func_units`)
+            holding the life cycle inventory per reference flow
+
+        """
+        demand = build_demand_matrix(self.lca, self.func_units)
+        if self.iterative_solver is not None:
+            supply = self.iterative_solver.solve(self.lca.technosphere_matrix, demand)
+            self._advance_progress(2)
+        else:
+            if not hasattr(self.lca, "solver"):
+                self._factorize()
+            self._advance_progress()
+            supply = solve_demand_matrix(self.lca, demand)
+            self._advance_progress()
+        inventory = self.lca.biosphere_matrix @ supply
+        return supply, inventory
+
+    def _stack_method_matrices(self) -> np.ndarray:
+        """Stack the diagonal characterization matrices of all methods into
+        one dense array of shape (`methods`, `biosphere`).
+        """
+        return np.vstack([cf_matrix.diagonal() for cf_matrix in self.method_matrices])
+
+    def _characterize(self, supply: np.ndarray, inventory: np.ndarray,
+                      store: Callable[[int, np.ndarray, np.ndarray], None]) -> np.ndarray:
+        """Characterize the inventories of all reference flows for all
+        methods over the stacked characterization factors.
+
+        The contributions are handed to `store` one method at a time, so
+        only the contributions of a single method are held as dense
+        float64 arrays before they are stored in the `ContributionStorage`.
+
+        Parameters
+        ----------
+        supply : `numpy.ndarray`
+            Supply array of shape (`technosphere`, `func_units`)
+        inventory : `numpy.ndarray`
+            Inventory array of shape (`biosphere`, `func_units`)
+        store : callable
+            Called with the method index and the elementary flow and process
+            contributions of that method, of shape (`func_units`,
+            `biosphere`) and (`func_units`, `technosphere`)
+
+        Returns
+        -------
+        scores : `numpy.ndarray`
+            Array of shape (`func_units`, `methods`)
+
+        """
+        cfs = self.characterization_factors
+        scores = (cfs @ inventory).T
+        # Characterized biosphere flows per unit of process, scaled by the supply.
+        cf_per_process = (self.lca.biosphere_matrix.T @ cfs.T).T
+        for col in range(len(self.methods)):
+            store(col, cfs[col] * inventory.T, cf_per_process[col] * supply.T)
+            self._advance_progress()
+        return scores
+
+    def _store_contributions(self, col: int, ef_contributions: np.ndarray,
+                             process_contributions: np.ndarray) -> None:
+        self.elementary_flow_contributions[:, col] = ef_contributions
+        self.process_contributions[:, col] = process_contributions
+
     def _perform_calculations(self):
         """ Isolates the code which performs calculations to allow subclasses
         to either alter the code or redo calculations after matrix substitution.
         """
-        for row, func_unit in enumerate(self.func_units):
-            # Do the LCA for the current reference flow
-            self.lca.redo_lci(func_unit)
+        supply, inventory = self._solve_func_units()
+        diagonal = self.lca.technosphere_matrix.diagonal()
 
+        for row, func_unit in enumerate(self.func_units):
             # Now update the:
             # - Scaling factors
             # - Technosphere flows
             # - Life cycle inventory
-            # - Life-cycle inventory (disaggregated by contributing process)
             # for current reference flow
             self.scaling_factors.update({
-                str(func_unit): self.lca.supply_array
+                str(func_unit): supply[:, row]
             })
             self.technosphere_flows.update({
-                str(func_unit): np.multiply(self.lca.supply_array, self.lca.technosphere_matrix.diagonal())
+                str(func_unit): np.multiply(supply[:, row], diagonal)
             })
             self.inventory.update({
-                str(func_unit): np.array(self.lca.inventory.sum(axis=1)).ravel()
-            })
-            self.inventories.update({
-                str(func_unit): self.lca.inventory
+                str(func_unit): inventory[:, row]
             })
+        # Drop (characterized) inventories of any earlier calculation.
+        self.inventories.clear()
+        self.characterized_inventories.clear()
 
-            # Now, for each method, take the current reference flow and do inventory analysis
-            for col, cf_matrix in enumerate(self.method_matrices):
-                self.lca.characterization_matrix = cf_matrix
-                self.lca.lcia_calculation()
-                self.lca_scores[row, col] = self.lca.score
-                self.characterized_inventories[row, col] = self.lca.characterized_inventory.copy()
-                self.elementary_flow_contributions[row, col] = np.array(
-                    self.lca.characterized_inventory.sum(axis=1)).ravel()
-                self.process_contributions[row, col] = self.lca.characterized_inventory.sum(axis=0)
+        # Characterize the inventories of all reference flows, one method at a time
+        self.lca_scores[:, :] = self._characterize(supply, inventory, self._store_contributions)
 
-    def calculate(self):
-        self._perform_calculations()
+    def _inventory_matrix(self, key: str) -> sparse.csr_matrix:
+        """Return the inventory disaggregated by contributing process for the
+        given reference flow, built from its scaling factors.
+        """
+        return self.lca.biosphere_matrix @ sparse.diags(self.scaling_factors[key])
+
+    def _characterized_inventory_matrix(self, key: tuple) -> sparse.csr_matrix:
+        """Return the characterized inventory for the given (reference flow,
+        method) index combination.
+        """
+        row, col = key
+        return self.method_matrices[col] @ self.inventories[str(self.func_units[row])]
+
+    def calculate(self, progress: Optional[Callable[[int, int], None]] = None):
+        """Perform the calculations.
+
+        The optional `progress` callable (or the one given on construction)
+        is called with the number of completed and total steps after every
+        stage: factorizing and solving the technosphere and characterizing
+        each method, see `progress_total`. It may raise an exception to
+        abort the calculation.
+        """
+        if progress is not None:
+            self.progress = progress
+        self._progress_done = self.LOAD_STEPS
+        try:
+            self._perform_calculations()
+        finally:
+            self.progress = None
+
+    @property
+    def progress_total(self) -> int:
+        """Total number of steps reported to `progress`: loading the
+        inventory and characterization data, factorizing and solving the
+        technosphere, and characterizing each method.
+        """
+        return self.LOAD_STEPS + self.SOLVE_STEPS + len(self.methods)
+
+    def _advance_progress(self, steps: int = 1) -> None:
+        self._progress_done += steps
+        if self.progress is not None:
+            self.progress(self._progress_done, self.progress_total)
+
+    def update_lca_calculation(self, func_unit: dict, method_index: int) -> None:
+        """Prepare the LCA object for a graph traversal of the given
+        reference flow and method, reusing its technosphere factorization.
+        """
+        if not hasattr(self.lca, "solver"):
+            self._factorize()
+        self.lca.build_demand_array(func_unit)
+        self.lca.lci_calculation()
+        self.lca.method = self.methods[method_index]
+        self.lca.characterization_matrix = self.method_matrices[method_index]
+        self.lca.lcia_calculation()
+
+    def __getstate__(self) -> dict:
+        """Leave out the technosphere factorization and the on-demand
+        inventories when pickling, see `ResultCache`.
+        """
+        state = self.__dict__.copy()
+        state["lca"] = copy.copy(self.lca)
+        state["lca"].__dict__.pop("solver", None)
+        state["iterative_solver"] = iterative_solver(self.solver, self.tol)
+        state["progress"] = None
+        del state["inventories"], state["characterized_inventories"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.inventories = LazyMatrixCache(self._inventory_matrix, self.INVENTORY_CACHE_SIZE)
+        self.characterized_inventories = LazyMatrixCache(
+            self._characterized_inventory_matrix, self.INVENTORY_CACHE_SIZE
+        )
 
     @property
     def func_units_dict(self) -> dict:
@@ -226,13 +457,19 @@ class MLCA(object):
     def all_databases(self) -> set:
         """ Get all databases linked to the reference flows.
         """
+        return self.linked_databases(self.fu_activity_keys)
+
+    @staticmethod
+    def linked_databases(keys: Iterable[tuple]) -> set:
+        """ Get all databases linked to the given activity keys.
+        """
         def get_dependents(dbs: set, dependents: list) -> set:
             for dep in (bw.databases[db].get('depends', []) for db in dependents):
                 if not dbs.issuperset(dep):
                     dbs = get_dependents(dbs.union(dep), dep)
             return dbs
 
-        databases = set(f[0] for f in self.fu_activity_keys)
+        databases = set(k[0] for k in keys)
         databases = get_dependents(databases, list(databases))
         # In rare cases, the default biosphere is not found as a dependency, see:
         # https://github.com/LCA-ActivityBrowser/activity-browser/issues/298
@@ -609,7 +846,7 @@ class Contributions(object):
         return self._build_lca_scores_df(scores)
 
     @staticmethod
-    def _build_contributions(data: np.ndarray, index: int, axis: int) -> np.ndarray:
+    def _build_contributions(data: Union[np.ndarray, ContributionStorage], index: int, axis: int) -> np.ndarray:
         return data.take(index, axis=axis)
 
     def get_contributions(self, contribution, functional_unit=None,
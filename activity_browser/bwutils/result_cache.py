@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache of the results of the MLCA classes.
+
+The calculated MLCA objects are stored under a hash of everything the
+calculation depends on: the calculation setup, the calculation options,
+the modification stamps of the databases and impact categories and, for
+scenario calculations, the scenario data. Any change to one of these
+results in a new key, so stale results are never loaded, they are only
+evicted once the cache grows too large or too old.
+"""
+import hashlib
+import os
+import pickle
+import time
+from typing import Optional
+
+import brightway2 as bw
+import pandas as pd
+
+from .multilca import MLCA
+
+
+class ResultCache(object):
+    """Cache of MLCA results in the 'results' directory of the current project.
+
+    Parameters
+    ----------
+    directory : str, optional
+        Directory to store the results in
+    max_size : int
+        Maximum total size of the cache in bytes, the least recently used
+        results are removed first when the cache grows beyond this size
+    max_age : float
+        Maximum age in seconds of the results since they were last used
+
+    """
+    EXTENSION = ".pickle"
+    # Changes whenever the pickled MLCA classes change.
+    VERSION = 2
+
+    def __init__(self, directory: Optional[str] = None, max_size: int = 2 * 1024 ** 3,
+                 max_age: float = 30 * 24 * 3600):
+        self.directory = directory or bw.projects.request_directory("results")
+        self.max_size = max_size
+        self.max_age = max_age
+
+    @classmethod
+    def key(cls, cs_name: str, options: dict, df: Optional[pd.DataFrame] = None) -> str:
+        """Return the hash of everything the results of the calculation
+        setup depend on, without constructing the MLCA.
+
+        The `options` are the keyword arguments changing the results of the
+        MLCA (storage, top_n, solver and tol). Results with the `df` are
+        those of the `SuperstructureMLCA` for that scenario data.
+        """
+        cs = bw.calculation_setups[cs_name]
+        parts = [
+            str(cls.VERSION), "simple" if df is None else "scenario",
+            repr(cs["inv"]), repr(cs["ia"]), repr(sorted(options.items())),
+        ]
+        keys = [key for func_unit in cs["inv"] for key in func_unit]
+        for db in sorted(MLCA.linked_databases(keys)):
+            meta = bw.databases[db]
+            parts.append(repr((db, meta.get("modified"), meta.get("processed"))))
+        for method in cs["ia"]:
+            path = bw.Method(method).filepath_processed()
+            parts.append(repr((method, os.path.getmtime(path), os.path.getsize(path))))
+        if df is not None:
+            parts.append(repr(list(df.columns)))
+            parts.append(pd.util.hash_pandas_object(df, index=True).values.tobytes().hex())
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.EXTENSION)
+
+    def load(self, key: str) -> Optional[MLCA]:
+        """Return the calculated MLCA cached under the key, or None if no
+        (readable) results are cached under the key.
+
+        The MLCA is restored as it was after the calculation, without
+        loading the inventory data again or factorizing the technosphere.
+        """
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                mlca = pickle.load(f)
+        except Exception:
+            # Unreadable, or written by an incompatible version of the code.
+            os.remove(path)
+            return None
+        # Mark the results as recently used.
+        os.utime(path)
+        return mlca
+
+    def save(self, key: str, mlca: MLCA) -> None:
+        """Store the calculated MLCA under the key and evict old results
+        from the cache.
+        """
+        path = self._path(key)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            pickle.dump(mlca, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove the results which have not been used for longer than
+        `max_age`, then the least recently used results until the cache
+        fits in `max_size`.
+        """
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.EXTENSION):
+                continue
+            path = os.path.join(self.directory, name)
+            stat = os.stat(path)
+            if now - stat.st_mtime > self.max_age:
+                os.remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self) -> None:
+        for name in os.listdir(self.directory):
+            if name.endswith(self.EXTENSION):
+                os.remove(os.path.join(self.directory, name))
@@ -4,19 +4,35 @@
 # Global Sensitivity Analysis (GSA) functions and class for the Delta
 # Moment-Independent measure based on Monte Carlo simulation LCA results.
 # see: https://salib.readthedocs.io/en/latest/api.html#delta-moment-independent-measure
+# Cheaper (screening) estimators are available as well, see ESTIMATORS.
 # =============================================================================
 
+from collections import defaultdict, namedtuple
+import copy
+
 import brightway2 as bw
+from bw2data.backends.peewee import ActivityDataset, ExchangeDataset
+from bw2data.backends.peewee.proxies import Activity, Exchange
 import numpy as np
+from peewee import chunked
 import pandas as pd
+from scipy import sparse
+from scipy.stats import rankdata
 from time import time
 import traceback
 from SALib.analyze import delta
 import os
 
+from .characterization import characterization_cache
 from .montecarlo import MonteCarloLCA, perform_MonteCarlo_LCA
+from .solvers import factorize_technosphere, factorized
+from .workers import process_pool
 from ..settings import ab_settings
 
+# Maximum number of codes in a single query, well below the SQLite limit
+# on the number of variables in a query.
+QUERY_CHUNK_SIZE = 500
+
 
 def get_lca(fu, method):
     """Calculates a non-stochastic LCA and returns a the LCA object."""
@@ -31,6 +47,39 @@ def get_lca(fu, method):
     return lca
 
 
+def get_mc_lca(mc):
+    """Returns a non-stochastic LCA object of all reference flows of the
+    Monte Carlo LCA, in the same index space as its sampled matrices.
+
+    The inventory data is only loaded if the Monte Carlo LCA has not done
+    so yet and the technosphere is factorized once, see `calculate_lca`.
+    """
+    lca = copy.copy(mc.lca)
+    for attr in ("solver", "transposed_solver"):
+        lca.__dict__.pop(attr, None)
+    if hasattr(lca, "tech_params"):
+        # The matrices may hold the values of the last Monte Carlo iteration.
+        lca.rebuild_technosphere_matrix(lca.tech_params["amount"])
+        lca.rebuild_biosphere_matrix(lca.bio_params["amount"])
+    else:
+        lca.load_lci_data()
+    factorize_technosphere(lca)
+
+    # add reverse dictionaries
+    lca.activity_dict_rev, lca.product_dict_rev, lca.biosphere_dict_rev = lca.reverse_dict()
+    return lca
+
+
+def calculate_lca(lca, fu, method):
+    """Calculates the LCA score of a reference flow and impact category
+    with an LCA object from `get_mc_lca`, reusing its factorization."""
+    lca.build_demand_array(fu)
+    lca.lci_calculation()
+    characterization_cache.load(lca, method)
+    lca.lcia_calculation()
+    print('Non-stochastic LCA score:', lca.score)
+
+
 def filter_technosphere_exchanges(fu, method, cutoff=0.05, max_calc=1e4):
     """Use brightway's GraphTraversal to identify the relevant
     technosphere exchanges in a non-stochastic LCA."""
@@ -52,6 +101,39 @@ def filter_technosphere_exchanges(fu, method, cutoff=0.05, max_calc=1e4):
     return technosphere_exchange_indices
 
 
+def filter_technosphere_exchanges_matrix(lca, cutoff=0.05):
+    """Identify the relevant technosphere exchanges directly from the
+    matrices of a solved non-stochastic LCA.
+
+    The contribution of an exchange is the amount of product used by the
+    consuming activity (its supply times the matrix value) times the total
+    impact of producing one unit of that product. The unit impacts of all
+    products follow from a single solve of the transposed technosphere
+    matrix, which is kept on the LCA object for further impact categories.
+    """
+    start = time()
+    A = lca.technosphere_matrix.tocoo()
+    if not hasattr(lca, "transposed_solver"):
+        lca.transposed_solver = factorized(lca.technosphere_matrix.T.tocsc())
+    direct = np.asarray((lca.characterization_matrix @ lca.biosphere_matrix).sum(axis=0)).ravel()
+    unit_scores = np.asarray(lca.transposed_solver(direct)).ravel()
+
+    # Inputs are negative in the technosphere matrix.
+    contributions = -A.data * lca.supply_array[A.col] * unit_scores[A.row]
+    relevant = (A.row != A.col) & (np.abs(contributions) > abs(lca.score) * cutoff)
+    order = np.argsort(-np.abs(contributions[relevant]), kind="stable")
+    technosphere_exchange_indices = list(zip(
+        A.row[relevant][order].tolist(), A.col[relevant][order].tolist()
+    ))
+    print('TECHNOSPHERE {} filtering resulted in {} of {} exchanges in {} seconds.'.format(
+        lca.technosphere_matrix.shape,
+        len(technosphere_exchange_indices),
+        lca.technosphere_matrix.getnnz(),
+        np.round(time() - start, 2),
+    ))
+    return technosphere_exchange_indices
+
+
 def filter_biosphere_exchanges(lca, cutoff=0.005):
     """Reduce biosphere exchanges to those that matter for a given impact
     category in a non-stochastic LCA."""
@@ -76,10 +158,36 @@ def filter_biosphere_exchanges(lca, cutoff=0.005):
     return biosphere_exchange_indices
 
 
+def get_activities(keys):
+    """Get the activity objects of the given keys in a single query per
+    database, instead of one query per key.
+
+    Returns
+    -------
+    activities : dict
+        Dictionary of activity objects by key
+    """
+    codes = defaultdict(set)
+    for db, code in keys:
+        codes[db].add(code)
+    activities = dict()
+    for db, db_codes in codes.items():
+        for chunk in chunked(sorted(db_codes), QUERY_CHUNK_SIZE):
+            query = ActivityDataset.select().where(
+                (ActivityDataset.database == db) & (ActivityDataset.code.in_(chunk))
+            )
+            for ds in query:
+                activities[(ds.database, ds.code)] = Activity(ds)
+    return activities
+
+
 def get_exchanges(lca, indices, biosphere=False, only_uncertain=True):
     """Get actual exchange objects from indices.
     By default get only exchanges that have uncertainties.
 
+    The exchanges of all indices are retrieved in a single query per
+    database of the consuming activities.
+
     Returns
     -------
     exchanges : list
@@ -87,18 +195,25 @@ def get_exchanges(lca, indices, biosphere=False, only_uncertain=True):
     indices : list of tuples
         List of indices
     """
-    exchanges = list()
-    for i in indices:
-        if biosphere:
-            from_act = bw.get_activity(lca.biosphere_dict_rev[i[0]])
-        else:  # technosphere
-            from_act = bw.get_activity(lca.activity_dict_rev[i[0]])
-        to_act = bw.get_activity(lca.activity_dict_rev[i[1]])
+    from_dict = lca.biosphere_dict_rev if biosphere else lca.activity_dict_rev
+    pairs = [(lca.activity_dict_rev[i[1]], from_dict[i[0]]) for i in indices]
+
+    codes = defaultdict(set)
+    for (db, code), _ in pairs:
+        codes[db].add(code)
+    by_pair = defaultdict(list)
+    for db, db_codes in codes.items():
+        for chunk in chunked(sorted(db_codes), QUERY_CHUNK_SIZE):
+            query = ExchangeDataset.select().where(
+                (ExchangeDataset.output_database == db) & (ExchangeDataset.output_code.in_(chunk))
+            ).order_by(ExchangeDataset.id)
+            for ds in query:
+                by_pair[((ds.output_database, ds.output_code), (ds.input_database, ds.input_code))].append(ds)
 
-        for exc in to_act.exchanges():
-            if exc.input == from_act.key:
-                exchanges.append(exc)
-                # continue  # if there was always only one max exchange between two activities
+    exchanges = list()
+    for pair in pairs:
+        # if there was always only one max exchange between two activities, this would be a single exchange
+        exchanges.extend(Exchange(ds) for ds in by_pair.get(pair, []))
 
     # in theory there should be as many exchanges as indices, but since
     # multiple exchanges are possible between two activities, the number of
@@ -131,9 +246,12 @@ def drop_no_uncertainty_exchanges(excs, indices):
 def get_exchanges_dataframe(exchanges, indices, biosphere=False):
     """Returns a Dataframe from the exchange data and a bit of additional information."""
 
+    activities = get_activities(
+        {exc.get('input') for exc in exchanges} | {exc.get('output') for exc in exchanges}
+    )
     for exc, i in zip(exchanges, indices):
-        from_act = bw.get_activity(exc.get('input'))
-        to_act = bw.get_activity(exc.get('output'))
+        from_act = activities[exc.get('input')]
+        to_act = activities[exc.get('output')]
 
         exc.update(
             {
@@ -174,15 +292,19 @@ def get_CF_dataframe(lca, only_uncertain_CFs=True):
     """Returns a dataframe with the metadata for the characterization factors
     (in the biosphere matrix). Filters non-stochastic CFs if desired (default)."""
     data = dict()
-    for params_index, row in enumerate(lca.cf_params):
-        if only_uncertain_CFs and row['uncertainty_type'] <= 1:
-            continue
+    uncertain = [
+        params_index for params_index, row in enumerate(lca.cf_params)
+        if not (only_uncertain_CFs and row['uncertainty_type'] <= 1)
+    ]
+    activities = get_activities({lca.biosphere_dict_rev[lca.cf_params[i]['row']] for i in uncertain})
+    for params_index in uncertain:
+        row = lca.cf_params[params_index]
         cf_index = row['row']
-        bio_act = bw.get_activity(lca.biosphere_dict_rev[cf_index])
+        bio_act = activities[lca.biosphere_dict_rev[cf_index]]
 
         data.update(
             {
-                params_index: bio_act.as_dict()
+                params_index: dict(bio_act.as_dict())
             }
         )
 
@@ -219,12 +341,47 @@ def get_exchange_values(matrix, indices):
     return [matrix[i] for i in indices]
 
 
+def get_data_positions(matrix, indices):
+    """Get the positions of the exchanges (row and column information) in
+    the data array of a CSR matrix. Exchanges that are not stored in the
+    matrix get position -1."""
+    n_rows, n_cols = matrix.shape
+    rows = np.repeat(np.arange(n_rows, dtype=np.int64), np.diff(matrix.indptr))
+    keys = rows * n_cols + matrix.indices
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+
+    wanted = np.asarray(indices, dtype=np.int64).reshape(-1, 2)
+    wanted = wanted[:, 0] * n_cols + wanted[:, 1]
+    found = np.minimum(np.searchsorted(keys, wanted), max(len(keys) - 1, 0))
+    positions = np.full(len(wanted), -1, dtype=np.int64)
+    if len(keys):
+        match = keys[found] == wanted
+        positions[match] = order[found[match]]
+    return positions
+
+
 def get_X(matrix_list, indices):
     """Get the input data to the GSA, i.e. A and B matrix values for each
-    model run."""
+    model run.
+
+    The matrices of all model runs are rebuilt from the same exchanges and
+    share their sparsity structure, so the exchanges are mapped to the data
+    array of the matrices once and the values of each run are gathered
+    with a single index."""
     X = np.zeros((len(matrix_list), len(indices)))
+    structure, positions, stored = None, None, None
     for row, M in enumerate(matrix_list):
-        X[row, :] = get_exchange_values(M, indices)
+        M = sparse.csr_matrix(M)
+        if structure is None or not (
+                M.indices is structure.indices or
+                (np.array_equal(M.indptr, structure.indptr) and np.array_equal(M.indices, structure.indices))
+        ):
+            structure = M
+            positions = get_data_positions(M, indices)
+            stored = positions >= 0
+            positions = positions[stored]
+        X[row, stored] = M.data[positions]
     return X
 
 
@@ -233,7 +390,7 @@ def get_X_CF(mc, dfcf, method):
     that are in the dfcf dataframe will be returned (i.e. by default only the
     CFs that have uncertainties."""
     # get all CF inputs
-    CF_data = np.array(mc.CF_dict[method])  # has the same shape as the Xa and Xb below
+    CF_data = np.asarray(mc.CF_dict[method])  # has the same shape as the Xa and Xb below
 
     # reduce this to uncertain CFs only (if this was done for the dfcf)
     params_indices = dfcf.index.values
@@ -256,10 +413,139 @@ def get_problem(X, names):
     }
 
 
+def transform_Y(Y):
+    """Log-transform the LCA scores if possible.
+
+    This makes it more robust for very uneven distributions of LCA results (e.g. toxicity related impacts).
+    Can only be applied if all Monte-Carlo LCA scores are either positive or negative.
+    Should not be used when LCA scores overlap zero (sometimes positive and sometimes negative)
+    """
+    if np.all(Y > 0):  # all positive numbers
+        print('All positive LCA scores. Log-transformation performed.')
+        return np.log(np.abs(Y))
+    elif np.all(Y < 0):  # all negative numbers
+        print('All negative LCA scores. Log-transformation performed.')
+        return -np.log(np.abs(Y))
+    # mixed positive and negative numbers
+    print('Log-transformation cannot be applied as LCA scores overlap zero.')
+    return Y
+
+
+def analyze_delta(problem, X, Y):
+    """Delta moment-independent measure, see:
+    https://salib.readthedocs.io/en/latest/api.html#delta-moment-independent-measure"""
+    return delta.analyze(problem, X, Y, print_to_console=False)
+
+
+def _standardized_coefficients(X, Y):
+    """Coefficients of the linear regression of the standardized Y on the
+    standardized X. Inputs without variation get a coefficient of 0."""
+    std = X.std(axis=0)
+    varying = std > 0
+    Xs = (X[:, varying] - X[:, varying].mean(axis=0)) / std[varying]
+    Ys = (Y - Y.mean()) / Y.std() if Y.std() > 0 else np.zeros_like(Y)
+    coefficients = np.zeros(X.shape[1])
+    coefficients[varying] = np.linalg.lstsq(Xs, Ys, rcond=None)[0]
+    return coefficients
+
+
+def analyze_src(problem, X, Y):
+    """Standardized regression coefficients."""
+    return {'SRC': _standardized_coefficients(np.asarray(X, dtype=np.float64), Y)}
+
+
+def analyze_srrc(problem, X, Y):
+    """Standardized rank regression coefficients, more robust than the SRC
+    for monotonic but non-linear models."""
+    return {'SRRC': _standardized_coefficients(rankdata(X, axis=0), rankdata(Y))}
+
+
+def analyze_spearman(problem, X, Y):
+    """Spearman rank correlation of each input with the LCA scores."""
+    Xr, Yr = rankdata(X, axis=0), rankdata(Y)
+    Xr -= Xr.mean(axis=0)
+    Yr -= Yr.mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rho = (Xr.T @ Yr) / np.sqrt((Xr ** 2).sum(axis=0) * (Yr ** 2).sum())
+    return {'spearman': np.nan_to_num(rho)}
+
+
+def analyze_borgonovo(problem, X, Y):
+    """Histogram estimate of the Borgonovo delta measure for screening.
+
+    For every input the samples are split into classes of (nearly) equal
+    size by the quantiles of the input. The measure is half the weighted
+    L1 distance between the histogram of the LCA scores within each class
+    and the histogram of all LCA scores, computed for all inputs at once.
+    """
+    n, k = X.shape
+    y_bins = max(int(np.sqrt(n)), 2)
+    x_classes = max(int(np.cbrt(n)), 2)
+    edges = np.histogram_bin_edges(Y, bins=y_bins)
+    y_index = np.clip(np.searchsorted(edges, Y, side='right') - 1, 0, y_bins - 1)
+    # Equal sized classes from the ranks, ties share a class.
+    x_index = np.minimum(((rankdata(X, axis=0, method='min') - 1) * x_classes / n).astype(int), x_classes - 1)
+
+    counts = np.zeros((x_classes, y_bins, k))
+    np.add.at(counts, (x_index, y_index[:, None], np.arange(k)[None, :]), 1)
+    class_sizes = counts.sum(axis=1, keepdims=True)
+    unconditional = np.bincount(y_index, minlength=y_bins)[None, :, None] / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        conditional = np.where(class_sizes > 0, counts / class_sizes, 0)
+    distance = np.abs(conditional - unconditional).sum(axis=1)
+    return {'borgonovo': 0.5 * (class_sizes[:, 0, :] / n * distance).sum(axis=0)}
+
+
+Estimator = namedtuple('Estimator', ('label', 'function', 'sort_by'))
+
+# Sensitivity measures by name, sorted on the absolute value of the sort_by column.
+ESTIMATORS = {
+    'delta': Estimator('Delta moment-independent measure', analyze_delta, 'delta'),
+    'borgonovo': Estimator('Borgonovo delta (histogram screening)', analyze_borgonovo, 'borgonovo'),
+    'srrc': Estimator('Standardized rank regression coefficients', analyze_srrc, 'SRRC'),
+    'src': Estimator('Standardized regression coefficients', analyze_src, 'SRC'),
+    'spearman': Estimator('Spearman rank correlation', analyze_spearman, 'spearman'),
+}
+
+
+def analyze(problem, X, Y, estimator='delta', screening=None, screening_top=100):
+    """Compute the sensitivity of Y to each of the inputs in X.
+
+    If a (cheaper) screening estimator is given, it is first run on all of
+    the inputs, after which the estimator only analyses the `screening_top`
+    most important inputs.
+
+    Returns
+    -------
+    pd.DataFrame
+        Sensitivity measures by GSA name, most important inputs first
+    """
+    X = np.asarray(X, dtype=np.float64)
+    names = list(problem['names'])
+    if screening and len(names) > screening_top:
+        screen = ESTIMATORS[screening]
+        importance = np.abs(np.asarray(screen.function(problem, X, Y)[screen.sort_by], dtype=np.float64))
+        keep = np.sort(np.argsort(-importance, kind='stable')[:screening_top])
+        print('Screening ({}) kept {} of {} inputs.'.format(screening, len(keep), len(names)))
+        X, names = X[:, keep], [names[i] for i in keep]
+        problem = get_problem(X, names)
+    method = ESTIMATORS[estimator]
+    Si = method.function(problem, X, Y)
+    df = pd.DataFrame(Si, index=pd.Index(names, name='GSA name'))
+    return df.sort_values(by=method.sort_by, ascending=False, key=np.abs)
+
+
+def analyze_outputs(problem, X, Ys, estimator='delta', screening=None, screening_top=100):
+    """Analyse the same inputs for each of the given outputs (columns of
+    Ys). Module-level, so it can run in a worker process."""
+    return [analyze(problem, X, Y, estimator, screening, screening_top) for Y in Ys.T]
+
+
 class GlobalSensitivityAnalysis(object):
     """Class for Global Sensitivity Analysis.
-    For now Delta Moment Independent Measure based on:
+    By default Delta Moment Independent Measure based on:
     https://salib.readthedocs.io/en/latest/api.html#delta-moment-independent-measure
+    or one of the other ESTIMATORS.
     Builds on top of Monte Carlo Simulation results.
     """
 
@@ -269,6 +555,7 @@ class GlobalSensitivityAnalysis(object):
         self.method_number = int()
         self.cutoff_technosphere = float()
         self.cutoff_biosphere = float()
+        self.estimator = 'delta'
 
     def update_mc(self, mc):
         "Update the Monte Carlo Simulation object (and results)."
@@ -281,9 +568,15 @@ class GlobalSensitivityAnalysis(object):
             )
 
     def perform_GSA(self, act_number=0, method_number=0,
-                    cutoff_technosphere=0.01, cutoff_biosphere=0.01):
-        """Perform GSA for specific reference flow and impact category."""
+                    cutoff_technosphere=0.01, cutoff_biosphere=0.01,
+                    estimator='delta', screening=None, screening_top=100):
+        """Perform GSA for specific reference flow and impact category.
+
+        The `estimator` and optional `screening` estimator are keys of
+        `ESTIMATORS`, see `analyze`.
+        """
         start = time()
+        self.estimator = estimator
 
         # set FU and method
         try:
@@ -306,7 +599,8 @@ class GlobalSensitivityAnalysis(object):
               'Activity:', self.activity, 'Method:', self.method)
 
         # get non-stochastic LCA object with reverse dictionaries
-        self.lca = get_lca(self.fu, self.method)
+        self.lca = get_mc_lca(self.mc)
+        calculate_lca(self.lca, self.fu, self.method)
 
         # =============================================================================
         #   Filter exchanges and get metadata DataFrames
@@ -314,9 +608,7 @@ class GlobalSensitivityAnalysis(object):
         dfs = []
         # technosphere
         if self.mc.include_technosphere:
-            self.t_indices = filter_technosphere_exchanges(self.fu, self.method,
-                                                           cutoff=cutoff_technosphere,
-                                                           max_calc=1e4)
+            self.t_indices = filter_technosphere_exchanges_matrix(self.lca, cutoff=cutoff_technosphere)
             self.t_exchanges, self.t_indices = get_exchanges(self.lca, self.t_indices)
             self.dft = get_exchanges_dataframe(self.t_exchanges, self.t_indices)
             if not self.dft.empty:
@@ -352,11 +644,18 @@ class GlobalSensitivityAnalysis(object):
 
         # Get X (Technosphere, Biosphere and CF values)
         X_list = list()
+        # When streaming, the matrix values are reconstructed from the stored samples.
         if self.mc.include_technosphere and self.t_indices:
-            self.Xa = get_X(self.mc.A_matrices, self.t_indices)
+            if self.mc.store is not None:
+                self.Xa = self.mc.get_exchange_samples(self.t_indices)
+            else:
+                self.Xa = get_X(self.mc.A_matrices, self.t_indices)
             X_list.append(self.Xa)
         if self.mc.include_biosphere and self.b_indices:
-            self.Xb = get_X(self.mc.B_matrices, self.b_indices)
+            if self.mc.store is not None:
+                self.Xb = self.mc.get_exchange_samples(self.b_indices, biosphere=True)
+            else:
+                self.Xb = get_X(self.mc.B_matrices, self.b_indices)
             X_list.append(self.Xb)
         if self.mc.include_cfs and not self.dfcf.empty:
             self.Xc = get_X_CF(self.mc, self.dfcf, self.method)
@@ -371,19 +670,7 @@ class GlobalSensitivityAnalysis(object):
         # Get Y (LCA scores)
         self.Y = self.mc.get_results_dataframe(act_key=self.activity.key)[self.method].to_numpy()
 
-        # log-transformation. This makes it more robust for very uneven distributions of LCA results (e.g. toxicity related impacts).
-        # Can only be applied if all Monte-Carlo LCA scores are either positive or negative.
-        # Should not be used when LCA scores overlap zero (sometimes positive and sometimes negative)
-        # if np.all(self.Y > 0) if self.Y[0] > 0 else np.all(self.Y < 0):  # check if all LCA scores are of the same sign
-        #     self.Y = np.log(np.abs(self.Y))  # this makes it more robust for very uneven distributions of LCA results
-        if np.all(self.Y > 0):  # all positive numbers
-            self.Y = np.log(np.abs(self.Y))
-            print('All positive LCA scores. Log-transformation performed.')
-        elif np.all(self.Y < 0):  # all negative numbers
-            self.Y = -np.log(np.abs(self.Y))
-            print('All negative LCA scores. Log-transformation performed.')
-        else:  # mixed positive and negative numbers
-            print('Log-transformation cannot be applied as LCA scores overlap zero.')
+        self.Y = transform_Y(self.Y)
 
         # print('Filtering took {} seconds'.format(np.round(time() - start, 2)))
 
@@ -392,24 +679,154 @@ class GlobalSensitivityAnalysis(object):
         # print('Names:', len(self.names))
         self.problem = get_problem(self.X, self.names)
 
-        # perform delta analysis
+        # perform the sensitivity analysis, put GSA results in to dataframe
         time_delta = time()
-        self.Si = delta.analyze(self.problem, self.X, self.Y, print_to_console=False)
-        print('Delta analysis took {} seconds'.format(np.round(time() - time_delta, 2), ))
-
-        # put GSA results in to dataframe
-        self.dfgsa = pd.DataFrame(self.Si, index=self.names).sort_values(by='delta', ascending=False)
-        self.dfgsa.index.names = ['GSA name']
+        self.dfgsa = analyze(self.problem, self.X, self.Y, estimator, screening, screening_top)
+        print('{} took {} seconds'.format(ESTIMATORS[estimator].label, np.round(time() - time_delta, 2), ))
 
         # join with metadata
         self.df_final = self.dfgsa.join(self.metadata, on='GSA name')
         self.df_final.reset_index(inplace=True)
-        self.df_final['pedigree'] = [str(x) for x in self.df_final['pedigree']]
+        if 'pedigree' in self.df_final:
+            self.df_final['pedigree'] = [str(x) for x in self.df_final['pedigree']]
+
+        print('GSA took {} seconds'.format(np.round(time() - start, 2)))
+
+    def perform_GSA_all(self, cutoff_technosphere=0.01, cutoff_biosphere=0.01, workers=1,
+                        estimator='delta', screening=None, screening_top=100):
+        """Perform GSA for all reference flows and impact categories at once.
+
+        The relevant exchanges of all reference flow and impact category
+        combinations are combined, so the input data X is shared by all
+        outputs and only the characterization factors differ per impact
+        category. The analyses are spread over `workers` processes, one
+        impact category at a time. See `perform_GSA` for the estimators.
+
+        Returns
+        -------
+        pd.DataFrame
+            Sensitivity indices with a row per reference flow, impact
+            category and input
+        """
+        start = time()
+        self.estimator = estimator
+        self.act_number = None
+        self.method_number = None
+        self.activity = None
+        self.method = None
+        self.cutoff_technosphere = cutoff_technosphere
+        self.cutoff_biosphere = cutoff_biosphere
+        func_units, methods = self.mc.cs['inv'], self.mc.cs['ia']
+
+        print('-- GSA --\n Project:', bw.projects.current, 'CS:', self.mc.cs_name,
+              'Reference flows:', len(func_units), 'Methods:', len(methods))
+
+        # =============================================================================
+        #   Filter exchanges of every reference flow and impact category
+        # =============================================================================
+        # A single LCA of all reference flows, so all indices are those of the Monte Carlo matrices.
+        t_indices, b_indices = dict(), dict()
+        self.dfcfs = dict()
+        self.lca = get_mc_lca(self.mc)
+        for act_number, fu in enumerate(func_units):
+            for method in methods:
+                calculate_lca(self.lca, fu, method)
+                if self.mc.include_technosphere:
+                    t_indices.update(dict.fromkeys(
+                        filter_technosphere_exchanges_matrix(self.lca, cutoff=cutoff_technosphere)
+                    ))
+                if self.mc.include_biosphere:
+                    b_indices.update(dict.fromkeys(filter_biosphere_exchanges(self.lca, cutoff=cutoff_biosphere)))
+                if self.mc.include_cfs and act_number == 0:
+                    self.dfcfs[method] = get_CF_dataframe(self.lca, only_uncertain_CFs=True)
+
+        dfs = []
+        self.t_indices, self.b_indices = list(t_indices), list(b_indices)
+        if self.mc.include_technosphere:
+            self.t_exchanges, self.t_indices = get_exchanges(self.lca, self.t_indices)
+            self.dft = get_exchanges_dataframe(self.t_exchanges, self.t_indices)
+            if not self.dft.empty:
+                dfs.append(self.dft)
+        if self.mc.include_biosphere:
+            self.b_exchanges, self.b_indices = get_exchanges(self.lca, self.b_indices, biosphere=True)
+            self.dfb = get_exchanges_dataframe(self.b_exchanges, self.b_indices, biosphere=True)
+            if not self.dfb.empty:
+                dfs.append(self.dfb)
+        self.dfp = get_parameters_DF(self.mc)  # Empty df if no parameters
+        if not self.dfp.empty:
+            dfs.append(self.dfp)
+
+        # =============================================================================
+        #     Shared X
+        # =============================================================================
+        X_list = list()
+        if self.mc.include_technosphere and self.t_indices:
+            if self.mc.store is not None:
+                self.Xa = self.mc.get_exchange_samples(self.t_indices)
+            else:
+                self.Xa = get_X(self.mc.A_matrices, self.t_indices)
+            X_list.append(self.Xa)
+        if self.mc.include_biosphere and self.b_indices:
+            if self.mc.store is not None:
+                self.Xb = self.mc.get_exchange_samples(self.b_indices, biosphere=True)
+            else:
+                self.Xb = get_X(self.mc.B_matrices, self.b_indices)
+            X_list.append(self.Xb)
+        if self.mc.include_parameters and not self.dfp.empty:
+            self.Xp = get_X_P(self.dfp)
+            X_list.append(self.Xp)
+        self.X = np.concatenate(X_list, axis=1) if X_list else np.zeros((self.mc.iterations, 0))
+        self.metadata = pd.concat(dfs, axis=0, ignore_index=True, sort=False) if dfs else pd.DataFrame()
+        if not self.metadata.empty:
+            self.metadata.set_index('GSA name', inplace=True)
+
+        # =============================================================================
+        #     GSA, per impact category for all reference flows
+        # =============================================================================
+        tasks = list()
+        for method_number, method in enumerate(methods):
+            X, metadata = self.X, self.metadata
+            dfcf = self.dfcfs.get(method)
+            if dfcf is not None and not dfcf.empty:
+                X = np.concatenate([X, get_X_CF(self.mc, dfcf, method)], axis=1)
+                metadata = pd.concat([metadata, dfcf.set_index('GSA name')], axis=0, sort=False)
+            if X.shape[1] == 0:
+                raise ValueError("No objects to concatenate")
+            Ys = np.column_stack([
+                transform_Y(np.asarray(self.mc.results[:, act_number, method_number]))
+                for act_number in range(len(func_units))
+            ])
+            tasks.append((get_problem(X, metadata.index), X, Ys, metadata))
+
+        time_delta = time()
+        options = (estimator, screening, screening_top)
+        if workers > 1 and len(tasks) > 1:
+            with process_pool(min(workers, len(tasks))) as pool:
+                results = list(pool.map(analyze_outputs, *zip(*[task[:3] + options for task in tasks])))
+        else:
+            results = [analyze_outputs(*task[:3], *options) for task in tasks]
+        print('{} took {} seconds'.format(ESTIMATORS[estimator].label, np.round(time() - time_delta, 2), ))
+
+        # put GSA results in to one (tidy) dataframe
+        dfs = list()
+        for method_number, ((_, _, _, metadata), dfgsas) in enumerate(zip(tasks, results)):
+            for act_number, dfgsa in enumerate(dfgsas):
+                dfgsa = dfgsa.join(metadata, on='GSA name').reset_index()
+                dfgsa.insert(0, 'impact category', str(methods[method_number]))
+                dfgsa.insert(0, 'reference flow', str(self.mc.rev_activity_index[act_number]))
+                dfs.append(dfgsa)
+        self.df_final = pd.concat(dfs, axis=0, ignore_index=True, sort=False)
+        if 'pedigree' in self.df_final:
+            self.df_final['pedigree'] = [str(x) for x in self.df_final['pedigree']]
 
         print('GSA took {} seconds'.format(np.round(time() - start, 2)))
+        return self.df_final
 
     def get_save_name(self):
-        save_name = self.mc.cs_name + '_' + str(self.mc.iterations) + '_' + self.activity['name'] + \
+        estimator = '' if self.estimator == 'delta' else '_' + self.estimator
+        if self.activity is None:  # all reference flows and impact categories
+            return (self.mc.cs_name + '_' + str(self.mc.iterations) + estimator + '_all.xlsx').replace("/", '')
+        save_name = self.mc.cs_name + '_' + str(self.mc.iterations) + estimator + '_' + self.activity['name'] + \
                     '_' + str(self.method) + '.xlsx'
         save_name = save_name.replace(',', '').replace("'", '').replace("/", '')
         return save_name
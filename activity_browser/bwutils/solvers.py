@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Linear algebra helpers shared by the multi-LCA classes.
+
+The brightway `LCA` class solves the technosphere matrix for a single demand
+vector at a time. The functions below allow a single factorization of the
+technosphere matrix to be reused for a dense demand matrix, holding one
+column per reference flow, which is solved in a single call.
+
+For series of nearly identical technosphere matrices (scenarios, Monte Carlo
+iterations) the `IterativeSolver` can be used instead, which avoids a new
+factorization for every matrix.
+"""
+import inspect
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import LinearOperator, bicgstab, gmres, spilu
+
+try:
+    from pypardiso import factorized
+except ImportError:
+    from scipy.sparse.linalg import splu
+
+    def factorized(matrix: sparse.spmatrix):
+        """Return a solve function for the given matrix which accepts both
+        1-dimensional and 2-dimensional right-hand sides.
+
+        The scipy `factorized` function may return an UMFpack solver which
+        only accepts vectors, so SuperLU is used directly instead.
+        """
+        return splu(matrix.tocsc()).solve
+
+
+def factorize_technosphere(lca) -> None:
+    """Factorize the technosphere matrix of the given LCA object.
+
+    Sets the `solver` attribute on the LCA object, so that the regular
+    brightway calculations (`redo_lci`, `solve_linear_system`) reuse the
+    same factorization.
+    """
+    lca.solver = factorized(lca.technosphere_matrix.tocsc())
+
+
+def build_demand_matrix(lca, func_units: list) -> np.ndarray:
+    """Build a dense demand matrix of shape (products, reference flows)
+    where every column holds the demand of one reference flow.
+    """
+    demand = np.zeros((len(lca.product_dict), len(func_units)))
+    for col, func_unit in enumerate(func_units):
+        lca.build_demand_array(func_unit)
+        demand[:, col] = lca.demand_array
+    return demand
+
+
+def solve_demand_matrix(lca, demand: np.ndarray) -> np.ndarray:
+    """Solve the technosphere of the LCA object for all columns of the
+    demand matrix at once, factorizing the technosphere if required.
+
+    Returns the supply matrix of shape (activities, reference flows).
+    """
+    if not hasattr(lca, "solver"):
+        factorize_technosphere(lca)
+    supply = lca.solver(demand)
+    return np.asarray(supply).reshape(demand.shape)
+
+
+# Newer scipy versions renamed the relative tolerance argument to 'rtol'.
+_TOLERANCE = "rtol" if "rtol" in inspect.signature(bicgstab).parameters else "tol"
+
+
+class IterativeSolver(object):
+    """Solve a series of similar technosphere matrices with a preconditioned
+    Krylov method, warm-started from the solution of the previous matrix.
+
+    The preconditioner is built from the first matrix: either its complete
+    LU factorization ('lu'), which is then reused for all of the following
+    matrices, or an incomplete LU factorization ('ilu'). If the method does
+    not converge for a matrix, the matrix is factorized and solved directly
+    and the preconditioner is rebuilt from that matrix.
+    """
+    METHODS = {"bicgstab": bicgstab, "gmres": gmres}
+
+    def __init__(self, method: str = "bicgstab", tol: float = 1e-8,
+                 preconditioner: str = "lu", maxiter: int = 100):
+        if method not in self.METHODS:
+            raise ValueError("Unknown iterative method '{}'".format(method))
+        if preconditioner not in ("lu", "ilu"):
+            raise ValueError("Unknown preconditioner '{}'".format(preconditioner))
+        self.method = method
+        self.tol = tol
+        self.preconditioner = preconditioner
+        self.maxiter = maxiter
+        # Number of complete factorizations performed.
+        self.factorizations = 0
+        self._operator: Optional[LinearOperator] = None
+        self._previous: Optional[np.ndarray] = None
+
+    @staticmethod
+    def _incomplete_lu(matrix: sparse.spmatrix) -> LinearOperator:
+        ilu = spilu(matrix.tocsc(), drop_tol=1e-5, fill_factor=10)
+        return LinearOperator(matrix.shape, matvec=ilu.solve)
+
+    def _solve_direct(self, matrix: sparse.spmatrix, demand: np.ndarray) -> np.ndarray:
+        solve = factorized(matrix.tocsc())
+        self.factorizations += 1
+        if self.preconditioner == "lu":
+            self._operator = LinearOperator(matrix.shape, matvec=solve)
+        else:
+            self._operator = self._incomplete_lu(matrix)
+        return np.asarray(solve(demand)).reshape(demand.shape)
+
+    def _solve_iterative(self, matrix: sparse.spmatrix, demand: np.ndarray) -> Optional[np.ndarray]:
+        """Solve every demand column with the Krylov method, returns None if
+        any of the columns did not converge.
+        """
+        krylov = self.METHODS[self.method]
+        options = {_TOLERANCE: self.tol, "atol": 0.0, "maxiter": self.maxiter, "M": self._operator}
+        supply = np.empty(demand.shape)
+        for col in range(demand.shape[1]):
+            x0 = None if self._previous is None else self._previous[:, col]
+            x, info = krylov(matrix, demand[:, col], x0=x0, **options)
+            if info != 0:
+                return None
+            supply[:, col] = x
+        return supply
+
+    def solve(self, matrix: sparse.spmatrix, demand: np.ndarray) -> np.ndarray:
+        """Solve the matrix for all columns of the demand matrix.
+
+        Returns the supply matrix of shape (activities, reference flows).
+        """
+        if self._previous is not None and self._previous.shape != demand.shape:
+            self._previous = None
+        supply = None
+        if self._operator is None and self.preconditioner == "ilu":
+            self._operator = self._incomplete_lu(matrix)
+        if self._operator is not None:
+            supply = self._solve_iterative(matrix, demand)
+        if supply is None:
+            supply = self._solve_direct(matrix, demand)
+        self._previous = supply
+        return supply
+
+
+def iterative_solver(method: str = "direct", tol: float = 1e-8) -> Optional[IterativeSolver]:
+    """Return an iterative solver for the given method, or None if the
+    technosphere should be factorized and solved directly.
+    """
+    return None if method == "direct" else IterativeSolver(method, tol)
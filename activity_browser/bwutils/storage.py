@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+
+
+class ContributionStorage(object):
+    """Storage for the process and elementary flow contribution arrays of
+    the MLCA classes.
+
+    The contributions are shaped as (`func_units`, `methods`, [`scenarios`,]
+    `items`), where `items` is either the technosphere or the biosphere
+    dimension. Every combination of the leading dimensions is a 'row' of
+    contributions.
+
+    The storage supports numpy-like indexing over the leading dimensions,
+    always returning dense float64 arrays, so reading code does not need
+    to know which backend is used.
+
+    Parameters
+    ----------
+    shape : tuple
+        Full shape of the contribution array
+    backend : str
+        One of the following:
+        - 'float64': dense array, exact results (default)
+        - 'float32': dense array at half the memory, with single precision
+        - 'sparse': every row is stored as a sparse CSR row
+    top_n : int, optional
+        Only used by the 'sparse' backend. If given, only the `top_n`
+        largest (absolute) contributions of each row are stored, the
+        remaining contributions are dropped from the 'Rest' and 'Total'
+        values shown in the contribution tables.
+
+    """
+    BACKENDS = ("float64", "float32", "sparse")
+
+    def __init__(self, shape: tuple, backend: str = "float64", top_n: Optional[int] = None):
+        if backend not in self.BACKENDS:
+            raise ValueError("Unknown storage backend '{}', choose one of {}".format(backend, self.BACKENDS))
+        self.shape = tuple(shape)
+        self.backend = backend
+        self.top_n = top_n
+        if backend == "sparse":
+            # Maps each combination of the leading dimensions to a row number.
+            self._rows = np.arange(int(np.prod(self.shape[:-1]))).reshape(self.shape[:-1])
+            self._data = [None] * self._rows.size
+        else:
+            self._data = np.zeros(self.shape, dtype=backend)
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def nbytes(self) -> int:
+        if self.backend != "sparse":
+            return self._data.nbytes
+        return sum(
+            row.data.nbytes + row.indices.nbytes + row.indptr.nbytes
+            for row in self._data if row is not None
+        )
+
+    def _leading_key(self, key) -> tuple:
+        """Strip a trailing ':' over the items dimension from the key, only
+        the leading dimensions can be indexed in the sparse backend.
+        """
+        key = key if isinstance(key, tuple) else (key,)
+        if len(key) == self.ndim:
+            if key[-1] != slice(None):
+                raise IndexError("Sparse contributions can only be indexed on the leading dimensions")
+            key = key[:-1]
+        return key
+
+    def _compress(self, values: np.ndarray) -> sparse.csr_matrix:
+        """Convert a 2-dimensional (rows, items) array into CSR, keeping
+        only the top-N contributions of each row if required.
+        """
+        if self.top_n is not None and self.top_n < values.shape[1]:
+            values = values.copy()
+            cutoff = np.argpartition(np.abs(values), -self.top_n, axis=1)[:, :-self.top_n]
+            np.put_along_axis(values, cutoff, 0, axis=1)
+        return sparse.csr_matrix(values)
+
+    def __setitem__(self, key, values) -> None:
+        if self.backend != "sparse":
+            self._data[key] = values
+            return
+        rows = np.atleast_1d(self._rows[self._leading_key(key)])
+        values = np.broadcast_to(values, rows.shape + self.shape[-1:])
+        compressed = self._compress(values.reshape(-1, self.shape[-1]))
+        for i, row in enumerate(rows.ravel()):
+            self._data[row] = compressed[i]
+
+    def __getitem__(self, key) -> np.ndarray:
+        if self.backend != "sparse":
+            return np.asarray(self._data[key], dtype=np.float64)
+        rows = self._rows[self._leading_key(key)]
+        empty = sparse.csr_matrix((1, self.shape[-1]))
+        stacked = sparse.vstack(
+            [self._data[row] if self._data[row] is not None else empty
+             for row in np.atleast_1d(rows).ravel()]
+        )
+        return stacked.toarray().reshape(np.shape(rows) + self.shape[-1:])
+
+    def take(self, index: int, axis: int) -> np.ndarray:
+        """Similar to `numpy.take` for a single index along one of the
+        leading dimensions.
+        """
+        key = (slice(None),) * axis + (index,)
+        return self[key]
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Disk-backed storage and running statistics for Monte Carlo results.
+
+Keeping every sampled matrix of a Monte Carlo simulation in memory quickly
+exhausts the available RAM. The `SampleStore` writes the samples of every
+iteration to memory-mapped .npy files instead, while `RunningStatistics`
+keeps the mean, variance and a number of quantiles up-to-date without
+holding on to any of the samples.
+"""
+import os
+import shutil
+import tempfile
+from typing import Optional
+import weakref
+
+import brightway2 as bw
+import numpy as np
+
+
+class SampleStore(object):
+    """Collection of memory-mapped arrays with one row per iteration, stored
+    as .npy files in a single directory.
+
+    The store creating the directory removes it again when it is garbage
+    collected, stores opened on an existing directory (e.g. in worker
+    processes) leave the directory alone.
+    """
+    def __init__(self, directory: Optional[str] = None):
+        if directory is None:
+            directory = tempfile.mkdtemp(
+                prefix="mc_", dir=bw.projects.request_directory("montecarlo")
+            )
+            weakref.finalize(self, shutil.rmtree, directory, True)
+        self.directory = directory
+        self._arrays = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, "{}.npy".format(name))
+
+    def create(self, name: str, shape: tuple, dtype=np.float64) -> np.memmap:
+        """Create a new zero-filled array, the first dimension of the shape
+        should be the number of iterations.
+        """
+        array = np.lib.format.open_memmap(self._path(name), mode="w+", dtype=dtype, shape=shape)
+        self._arrays[name] = array
+        return array
+
+    def __getitem__(self, name: str) -> np.memmap:
+        if name not in self._arrays:
+            if not os.path.isfile(self._path(name)):
+                raise KeyError(name)
+            self._arrays[name] = np.lib.format.open_memmap(self._path(name), mode="r+")
+        return self._arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._arrays or os.path.isfile(self._path(name))
+
+    def flush(self) -> None:
+        for array in self._arrays.values():
+            array.flush()
+
+
+class P2Quantile(object):
+    """Estimate a quantile of a stream of samples with the P² algorithm of
+    Jain & Chlamtac (1985), vectorized over all cells of the samples.
+
+    Only five markers per cell are kept, regardless of the number of samples.
+    """
+    def __init__(self, p: float, shape: tuple):
+        self.p = p
+        self.shape = tuple(shape)
+        self.count = 0
+        self._initial = []
+        self.heights: Optional[np.ndarray] = None
+        self.positions: Optional[np.ndarray] = None
+        self.desired = np.array([0, 2 * p, 4 * p, 2 + 2 * p, 4])
+        self.increments = np.array([0, p / 2, p, (1 + p) / 2, 1])
+
+    def update(self, sample: np.ndarray) -> None:
+        x = np.asarray(sample, dtype=np.float64).ravel()
+        self.count += 1
+        if self.count <= 5:
+            self._initial.append(x)
+            if self.count == 5:
+                self.heights = np.sort(np.vstack(self._initial), axis=0)
+                self.positions = np.tile(np.arange(5.0)[:, np.newaxis], (1, x.size))
+                self._initial = []
+            return
+
+        q, n = self.heights, self.positions
+        q[0] = np.minimum(q[0], x)
+        q[4] = np.maximum(q[4], x)
+        # Find the cell k for which q[k] <= x < q[k + 1], shift the markers above.
+        k = (x >= q[1]).astype(int) + (x >= q[2]) + (x >= q[3])
+        n += np.arange(5)[:, np.newaxis] > k[np.newaxis, :]
+        self.desired = self.desired + self.increments
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            up = (d >= 1) & (n[i + 1] - n[i] > 1)
+            down = (d <= -1) & (n[i - 1] - n[i] < -1)
+            move = up | down
+            if not move.any():
+                continue
+            s = np.where(up, 1.0, -1.0)
+            parabolic = q[i] + s / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+            )
+            neighbour_q = np.where(up, q[i + 1], q[i - 1])
+            neighbour_n = np.where(up, n[i + 1], n[i - 1])
+            linear = q[i] + s * (neighbour_q - q[i]) / (neighbour_n - n[i])
+            valid = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            q[i] = np.where(move, np.where(valid, parabolic, linear), q[i])
+            n[i] = np.where(move, n[i] + s, n[i])
+
+    @property
+    def value(self) -> np.ndarray:
+        if self.count == 0:
+            return np.full(self.shape, np.nan)
+        if self.count < 5:
+            return np.quantile(np.vstack(self._initial), self.p, axis=0).reshape(self.shape)
+        return self.heights[2].reshape(self.shape)
+
+
+class RunningStatistics(object):
+    """Running mean and variance (Welford's algorithm) and quantiles (P²)
+    of samples with a fixed shape.
+    """
+    QUANTILES = (0.025, 0.5, 0.975)
+
+    def __init__(self, shape: tuple, quantiles: tuple = QUANTILES):
+        self.shape = tuple(shape)
+        self.count = 0
+        self.mean = np.zeros(self.shape)
+        self._m2 = np.zeros(self.shape)
+        self.quantiles = {p: P2Quantile(p, self.shape) for p in quantiles}
+
+    @classmethod
+    def from_samples(cls, samples: np.ndarray, quantiles: tuple = QUANTILES) -> 'RunningStatistics':
+        """Build the statistics by streaming through the samples, row by row."""
+        statistics = cls(samples.shape[1:], quantiles)
+        for sample in samples:
+            statistics.update(sample)
+        return statistics
+
+    def update(self, sample: np.ndarray) -> None:
+        self.count += 1
+        delta = sample - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (sample - self.mean)
+        for estimator in self.quantiles.values():
+            estimator.update(sample)
+
+    @property
+    def variance(self) -> np.ndarray:
+        if self.count < 2:
+            return np.full(self.shape, np.nan)
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+    def quantile(self, p: float) -> np.ndarray:
+        return self.quantiles[p].value
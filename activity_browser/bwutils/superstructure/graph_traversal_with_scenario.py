@@ -2,8 +2,9 @@
 from __future__ import print_function, unicode_literals, division
 
 from typing import Optional, Union
-from bw2calc import GraphTraversal
+from bw2calc import GraphTraversal, LCA
 from activity_browser.bwutils import MLCA, SuperstructureMLCA
+from activity_browser.bwutils.characterization import characterization_cache
 
 # TODO: This wont be required after migrating to brightway 2.5
 class GraphTraversalWithScenario(GraphTraversal):
@@ -12,4 +13,12 @@ class GraphTraversalWithScenario(GraphTraversal):
         self.mlca = mlca
 
     def build_lca(self, demand, method):
+        if self.mlca is None:
+            # Same as `GraphTraversal.build_lca`, with a cached characterization matrix.
+            lca = LCA(demand)
+            lca.lci()
+            characterization_cache.load(lca, method)
+            lca.lcia_calculation()
+            lca.decompose_technosphere()
+            return lca, lca.solve_linear_system(), lca.score
         return self.mlca.lca, self.mlca.lca.solve_linear_system(), self.mlca.lca.score
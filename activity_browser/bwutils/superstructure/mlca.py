@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
-from typing import Iterable, Optional
+from concurrent.futures import as_completed
+from typing import Callable, Iterable, Optional
 
-from bw2calc.matrices import TechnosphereBiosphereMatrixBuilder as MB
 import numpy as np
 import pandas as pd
+from scipy import sparse
 
 from ..commontasks import format_activity_label
 from ..multilca import MLCA, Contributions
+from ..storage import ContributionStorage
 from ..utils import Index
+from ..workers import process_pool
 from .dataframe import (
     scenario_names_from_df, arrays_from_indexed_superstructure,
     filter_databases_indexed_superstructure
@@ -24,13 +27,18 @@ class SuperstructureMLCA(MLCA):
         "production": "technosphere_matrix",
     }
 
-    def __init__(self, cs_name: str, df: pd.DataFrame):
+    def __init__(self, cs_name: str, df: pd.DataFrame, workers: int = 1,
+                 progress: Optional[Callable[[int, int], None]] = None, **kwargs):
         assert not df.empty, "Cannot run analysis without data."
         self.scenario_names = scenario_names_from_df(df)
         self.total = len(self.scenario_names)
         assert self.total > 0, "Cannot run analysis without scenarios"
 
-        super().__init__(cs_name)
+        super().__init__(cs_name, progress=progress, **kwargs)
+        # Scenarios are distributed over worker processes if workers > 1,
+        # each worker builds its own superstructure from the same arguments.
+        self.workers = workers
+        self._worker_args = (cs_name, df, kwargs)
 
         # Filter dataframe for keys that do not occur in the LCA matrix.
         df = filter_databases_indexed_superstructure(df, self.all_databases)
@@ -49,6 +57,20 @@ class SuperstructureMLCA(MLCA):
             ('row', np.uint32), ('col', np.uint32), ('type', np.uint8),
         ])
         self.indices_to_matrix()
+        self.kinds = set(idx.flow_type for idx in self.indices)
+        self.matrix_positions = self.build_matrix_positions()
+        # Values of the matrices before any scenario was applied.
+        self.base_values = {
+            name: getattr(self.lca, name).data[positions].copy()
+            for name, (_, positions, _) in self.matrix_positions.items()
+        }
+        # Biosphere matrix of the scenarios that change biosphere values,
+        # the others share the biosphere matrix without any scenario applied.
+        self.biosphere_matrices = dict()
+        self.base_biosphere_matrix = (
+            self.lca.biosphere_matrix.copy() if "biosphere_matrix" in self.matrix_positions
+            else self.lca.biosphere_matrix
+        )
 
         # Construct an index dictionary similar to fu_index and method_index
         self._current_index = 0
@@ -56,14 +78,19 @@ class SuperstructureMLCA(MLCA):
 
         # Rebuild numpy arrays with scenario dimension included.
         self.lca_scores = np.zeros((len(self.func_units), len(self.methods), self.total))
-        self.elementary_flow_contributions = np.zeros((
+        self.elementary_flow_contributions = ContributionStorage((
             len(self.func_units), len(self.methods), self.total,
             self.lca.biosphere_matrix.shape[0]
-        ))
-        self.process_contributions = np.zeros((
+        ), self.storage, self.top_n)
+        self.process_contributions = ContributionStorage((
             len(self.func_units), len(self.methods), self.total,
             self.lca.technosphere_matrix.shape[0]
-        ))
+        ), self.storage, self.top_n)
+
+    @property
+    def progress_total(self) -> int:
+        """The technosphere is solved and characterized for every scenario."""
+        return self.LOAD_STEPS + self.total * (self.SOLVE_STEPS + len(self.methods))
 
     @property
     def current(self) -> int:
@@ -80,12 +107,15 @@ class SuperstructureMLCA(MLCA):
         self.current += 1
 
     def set_scenario(self, index: int) -> None:
-        """ Set the current scenario index given a new index to go to
+        """ Set the current scenario index and apply the values of that
+        scenario to the matrices.
         """
-        steps = self._get_steps_to_index(index)
-        # self.current = steps[-1] + 1  # Walk the steps to the new index
-        for _ in steps:
-            self.next_scenario()
+        if index < 0:
+            raise ValueError("Negative indexes are not allowed")
+        elif index >= self.total:
+            raise ValueError("Given index is not possible for current scenario dataset")
+        self.current = index
+        self.update_matrices()
 
     def indices_to_matrix(self) -> None:
         def convert(idx: Index) -> tuple:
@@ -98,66 +128,168 @@ class SuperstructureMLCA(MLCA):
         for i, index in enumerate(self.indices):
             self.matrix_indices[i] = convert(index)
 
-    def update_matrices(self) -> None:
-        """A Simplified version of the `PackagesDataLoader.update_matrices` method.
+    def build_matrix_positions(self) -> dict:
+        """Determine once where the values of each scenario end up in the
+        `data` arrays of the LCA matrices.
 
-        In this case, we expect to only replace technosphere and biosphere
-        values, leaving out characterization factor values.
+        Positions that do not exist in a matrix yet are added to it as
+        explicit zeros, so every scenario can be written directly into the
+        `data` array without changing the sparsity structure.
+
+        Returns a dictionary of {matrix name: (selection, positions, signs)},
+        where `selection` selects the scenario values for the matrix,
+        `positions` indexes the `data` array and `signs` holds -1 for
+        technosphere inputs (see `fix_supply_use`).
         """
-        kinds = set([idx[2] for idx in self.indices])
-        types = np.array([idx[2] for idx in self.indices])
-        for kind in kinds:
-            idx = self.matrix_indices[types == kind]
-            sample = self.values[types == kind, self.current]
-            # Filter sample and idx for NaN values in samples.
-            idx = idx[~np.isnan(sample)]
-            sample = sample[~np.isnan(sample)]
-            try:
-                matrix = getattr(self.lca, self.matrices[kind])
-            except AttributeError:
+        types = np.array([idx.flow_type for idx in self.indices])
+        result = {}
+        for name in set(self.matrices[kind] for kind in self.kinds if kind in self.matrices):
+            if not hasattr(self.lca, name):
                 # This LCA doesn't have this matrix
                 continue
+            kinds = [kind for kind, matrix in self.matrices.items() if matrix == name]
+            selection = np.flatnonzero(np.isin(types, kinds))
+            idx = self.matrix_indices[selection]
+            matrix, positions = csr_positions(getattr(self.lca, name), idx["row"], idx["col"])
+            setattr(self.lca, name, matrix)
+            signs = np.where(types[selection] == "technosphere", -1.0, 1.0)
+            result[name] = (selection, positions, signs)
+        return result
 
-            if self.matrices[kind] == "technosphere_matrix":
-                # Remove existing matrix factorization
-                # because changing technosphere
-                if hasattr(self.lca, "solver"):
-                    delattr(self.lca, "solver")
+    def update_matrices(self) -> None:
+        """A Simplified version of the `PackagesDataLoader.update_matrices` method.
+
+        In this case, we expect to only replace technosphere and biosphere
+        values, leaving out characterization factor values. The values of
+        the current scenario are written directly into the `data` arrays
+        of the matrices, on top of the base values of the matrices. NaN
+        values in the scenario leave the base value in place.
 
-            if kind == "technosphere":
-                MB.fix_supply_use(idx, sample)
-            matrix[idx["row"], idx["col"], ] = sample
+        As only the current scenario is used, scenarios can be applied in
+        any order.
+        """
+        for name, (selection, positions, signs) in self.matrix_positions.items():
+            sample = self.values[selection, self.current]
+            valid = ~np.isnan(sample)
+            matrix = getattr(self.lca, name)
+            previous = matrix.data[positions]
+            matrix.data[positions] = self.base_values[name]
+            matrix.data[positions[valid]] = sample[valid] * signs[valid]
+
+            if name == "technosphere_matrix" and hasattr(self.lca, "solver"):
+                # Remove the existing matrix factorization only if the
+                # scenario actually changes the technosphere values.
+                if not np.array_equal(previous, matrix.data[positions]):
+                    delattr(self.lca, "solver")
 
     def _perform_calculations(self):
         """ Near copy of `MLCA` class, but includes a loop for all scenarios.
         """
-        for ps_col in range(self.total):
-            self.next_scenario()
-            for row, func_unit in enumerate(self.func_units):
-                self.lca.redo_lci(func_unit)
-                self.scaling_factors.update({
-                    (str(func_unit), ps_col): self.lca.supply_array
-                })
-                self.technosphere_flows.update({
-                    (str(func_unit), ps_col): np.multiply(
-                        self.lca.supply_array, self.lca.technosphere_matrix.diagonal()
-                    )
-                })
-                self.inventory.update({
-                    (str(func_unit), ps_col): np.array(self.lca.inventory.sum(axis=1)).ravel()
-                })
-                self.inventories.update({
-                    (str(func_unit), ps_col): self.lca.inventory
-                })
-
-                for col, cf_matrix in enumerate(self.method_matrices):
-                    self.lca.characterization_matrix = cf_matrix
-                    self.lca.lcia_calculation()
-                    self.lca_scores[row, col, ps_col] = self.lca.score
-                    self.characterized_inventories[(row, col, ps_col)] = self.lca.characterized_inventory.copy()
-                    self.elementary_flow_contributions[row, col, ps_col] = np.array(
-                        self.lca.characterized_inventory.sum(axis=1)).ravel()
-                    self.process_contributions[row, col, ps_col] = self.lca.characterized_inventory.sum(axis=0)
+        if self.workers > 1 and self.total > 1:
+            self._perform_parallel_calculations()
+        else:
+            for ps_col in range(self.total):
+                self.next_scenario()
+                results = self._scenario_results(
+                    lambda col, ef, pc: self._store_contributions(col, ef, pc, ps_col)
+                )
+                self._store_scenario_results(ps_col, results)
+        self.inventories.clear()
+        self.characterized_inventories.clear()
+
+    def _perform_parallel_calculations(self):
+        """Calculate every scenario as a separate task in worker processes,
+        storing the results of each scenario as soon as it comes in.
+
+        Every worker builds its own superstructure once, the contributions
+        are compressed into the storage backend inside the worker. If the
+        calculation is aborted (e.g. by the `progress` callable), the
+        scenarios not yet started are cancelled without waiting for them.
+        """
+        pool = process_pool(
+            min(self.workers, self.total), _initialize_scenario_worker, self._worker_args
+        )
+        futures = {pool.submit(_calculate_scenario, ps_col): ps_col for ps_col in range(self.total)}
+        try:
+            for future in as_completed(futures):
+                results, factorizations = future.result()
+                self._store_scenario_results(futures[future], results)
+                self.factorizations += factorizations
+                self._advance_progress(self.SOLVE_STEPS + len(self.methods))
+        except BaseException:
+            # Equivalent to `shutdown(cancel_futures=True)`, which requires python 3.9.
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=False)
+            raise
+        pool.shutdown()
+        # Leave the LCA object in the same state as the sequential calculation.
+        self.current = self.total - 1
+        self.next_scenario()
+
+    def _scenario_results(self, store) -> dict:
+        """Solve and characterize the scenario currently applied to the LCA,
+        the contributions are handed to `store`, see `MLCA._characterize`.
+        """
+        supply, inventory = self._solve_func_units()
+        scores = self._characterize(supply, inventory, store)
+        return {
+            "supply": supply,
+            "inventory": inventory,
+            "diagonal": self.lca.technosphere_matrix.diagonal(),
+            "biosphere": self._scenario_biosphere_matrix(),
+            "scores": scores,
+        }
+
+    def _scenario_biosphere_matrix(self) -> Optional[sparse.csr_matrix]:
+        """Return a copy of the biosphere matrix if the current scenario
+        changes any of its values, otherwise None.
+        """
+        if "biosphere_matrix" not in self.matrix_positions:
+            return None
+        _, positions, _ = self.matrix_positions["biosphere_matrix"]
+        if np.array_equal(self.lca.biosphere_matrix.data[positions], self.base_values["biosphere_matrix"]):
+            return None
+        return self.lca.biosphere_matrix.copy()
+
+    def _store_contributions(self, col: int, ef_contributions: np.ndarray,
+                             process_contributions: np.ndarray, ps_col: int = 0) -> None:
+        self.elementary_flow_contributions[:, col, ps_col] = ef_contributions
+        self.process_contributions[:, col, ps_col] = process_contributions
+
+    def _store_scenario_results(self, ps_col: int, results: dict) -> None:
+        supply, inventory = results["supply"], results["inventory"]
+        for row, func_unit in enumerate(self.func_units):
+            self.scaling_factors.update({
+                (str(func_unit), ps_col): supply[:, row]
+            })
+            self.technosphere_flows.update({
+                (str(func_unit), ps_col): np.multiply(supply[:, row], results["diagonal"])
+            })
+            self.inventory.update({
+                (str(func_unit), ps_col): inventory[:, row]
+            })
+        if results["biosphere"] is not None:
+            self.biosphere_matrices[ps_col] = results["biosphere"]
+        self.lca_scores[:, :, ps_col] = results["scores"]
+        # Contributions calculated in a worker process, already compressed.
+        if "ef_contributions" in results:
+            for col in range(len(self.methods)):
+                self._store_contributions(
+                    col, results["ef_contributions"][:, col], results["process_contributions"][:, col], ps_col
+                )
+
+    def _inventory_matrix(self, key: tuple) -> sparse.csr_matrix:
+        """Return the inventory for the given (reference flow, scenario) key,
+        using the biosphere matrix of that scenario.
+        """
+        _, ps_col = key
+        biosphere = self.biosphere_matrices.get(ps_col, self.base_biosphere_matrix)
+        return biosphere @ sparse.diags(self.scaling_factors[key])
+
+    def _characterized_inventory_matrix(self, key: tuple) -> sparse.csr_matrix:
+        row, col, ps_col = key
+        return self.method_matrices[col] @ self.inventories[(str(self.func_units[row]), ps_col)]
 
     def update_lca_calculation_for_sankey(self, scenario_index: int, func_unit: str, method_index: int):
         """
@@ -168,12 +300,8 @@ class SuperstructureMLCA(MLCA):
         @param func_unit: The functional unit for which the calculation must be performed
         @param method_index: Index of the method for which the calculation must be performed
         """
-        self.current = scenario_index
-        self.update_matrices()
-        self.lca.redo_lci(func_unit)
-        self.lca.characterization_matrix = self.method_matrices[method_index]
-        self.lca.lcia_calculation()
-        self.lca.decompose_technosphere()
+        self.set_scenario(scenario_index)
+        self.update_lca_calculation(func_unit, method_index)
 
     def get_results_for_method(self, index: int = 0) -> pd.DataFrame:
         """ Overrides the parent and returns a dataframe with the scenarios
@@ -184,23 +312,6 @@ class SuperstructureMLCA(MLCA):
             data, index=self.func_key_list, columns=self.scenario_names
         )
 
-    def _get_steps_to_index(self, index: int) -> list:
-        """ Determine how many steps to take when given the index we want
-         to land on.
-
-        We can only iterate through the presample arrays in one direction, so
-         if we go from 2 to 1 we need to calculate the amount of steps to loop
-         around to 1.
-        """
-        if index < 0:
-            raise ValueError("Negative indexes are not allowed")
-        elif index >= self.total:
-            raise ValueError("Given index is not possible for current scenario dataset")
-        if index < self.current:
-            return [*range(self.current, self.total), *range(index)]
-        else:
-            return list(range(self.current, index))
-
     def lca_scores_to_dataframe(self) -> pd.DataFrame:
         """Returns a dataframe of LCA scores using FU labels as index and
         the product of methods and scenarios as columns.
@@ -226,6 +337,68 @@ class SuperstructureMLCA(MLCA):
         return df
 
 
+# The superstructure of a worker process, see `_initialize_scenario_worker`.
+_worker_mlca: Optional[SuperstructureMLCA] = None
+
+
+def _initialize_scenario_worker(cs_name: str, df: pd.DataFrame, kwargs: dict) -> None:
+    """Build the superstructure used by all tasks of a worker process."""
+    global _worker_mlca
+    _worker_mlca = SuperstructureMLCA(cs_name, df, **kwargs)
+
+
+def _calculate_scenario(ps_col: int) -> (dict, int):
+    """Calculate the given scenario column inside a worker process.
+
+    Returns the results of the scenario, with the contributions compressed
+    into the storage backend, and the number of factorizations performed.
+    """
+    mlca = _worker_mlca
+    factorizations = mlca.factorizations
+    mlca.set_scenario(ps_col)
+    shape = (len(mlca.func_units), len(mlca.methods))
+    ef = ContributionStorage(shape + mlca.lca.biosphere_matrix.shape[:1], mlca.storage, mlca.top_n)
+    pc = ContributionStorage(shape + mlca.lca.technosphere_matrix.shape[:1], mlca.storage, mlca.top_n)
+
+    def store(col, ef_contributions, process_contributions):
+        ef[:, col] = ef_contributions
+        pc[:, col] = process_contributions
+    results = mlca._scenario_results(store)
+    results.update(ef_contributions=ef, process_contributions=pc)
+    return results, mlca.factorizations - factorizations
+
+
+def csr_positions(matrix: sparse.csr_matrix, rows: np.ndarray, cols: np.ndarray) -> (sparse.csr_matrix, np.ndarray):
+    """Return the positions of the given (row, col) elements in the `data`
+    array of the matrix.
+
+    If any of the elements are not stored in the matrix, a copy of the matrix
+    is returned in which these elements are stored as explicit zeros.
+    """
+    matrix = matrix.tocsr()
+    matrix.sum_duplicates()  # Ensures sorted indices, so the keys below are sorted.
+    width = matrix.shape[1]
+    keys = np.asarray(rows, dtype=np.int64) * width + np.asarray(cols, dtype=np.int64)
+
+    def stored_keys(m: sparse.csr_matrix) -> np.ndarray:
+        stored_rows = np.repeat(np.arange(m.shape[0], dtype=np.int64), np.diff(m.indptr))
+        return stored_rows * width + m.indices
+
+    stored = stored_keys(matrix)
+    positions = np.searchsorted(stored, keys)
+    missing = (positions >= len(stored)) | (stored[np.minimum(positions, len(stored) - 1)] != keys)
+    if missing.any():
+        coo = matrix.tocoo()
+        extra = np.unique(keys[missing])
+        matrix = sparse.csr_matrix((
+            np.concatenate([coo.data, np.zeros(len(extra))]),
+            (np.concatenate([coo.row, extra // width]), np.concatenate([coo.col, extra % width]))
+        ), shape=matrix.shape)
+        stored = stored_keys(matrix)
+        positions = np.searchsorted(stored, keys)
+    return matrix, positions
+
+
 class SuperstructureContributions(Contributions):
     mlca: SuperstructureMLCA
 
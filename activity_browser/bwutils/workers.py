@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers to distribute calculations over worker processes.
+
+Threads cannot be used for the calculations as the (pypardiso) solvers are
+not thread-safe. Each worker process therefore builds its own LCA objects
+and solvers, the 'spawn' start method is used on all platforms as forking
+a process running Qt is not safe.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from typing import Callable, Optional
+
+import brightway2 as bw
+import numpy as np
+
+from .commontasks import switch_brightway2_dir
+
+
+def initialize_worker(base_dir: str, project: str, initializer: Optional[Callable] = None,
+                      initargs: tuple = ()) -> None:
+    """Open the same brightway directory and project as the parent process,
+    then call the optional `initializer` with `initargs`.
+    """
+    switch_brightway2_dir(base_dir)
+    if bw.projects.current != project:
+        bw.projects.set_current(project, update=False)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def process_pool(workers: int, initializer: Optional[Callable] = None,
+                 initargs: tuple = ()) -> ProcessPoolExecutor:
+    """Return a process pool whose workers are initialized on the current
+    brightway directory and project.
+
+    The optional `initializer` is called with `initargs` in every worker
+    afterwards, e.g. to build the objects shared by all tasks of the worker.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=initialize_worker,
+        initargs=(bw.projects._base_data_dir, bw.projects.current, initializer, initargs),
+    )
+
+
+def split_work(total: int, workers: int) -> list:
+    """Split `total` units of work into (at most) `workers` contiguous chunks,
+    returned as lists of indexes. The split only depends on the arguments.
+    """
+    return [chunk.tolist() for chunk in np.array_split(np.arange(total), workers) if chunk.size]
+
+
+def worker_seeds(seed: int, workers: int) -> list:
+    """Derive independent, reproducible seeds for every worker from the
+    given seed.
+    """
+    return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(workers)]
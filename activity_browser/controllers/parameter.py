@@ -2,11 +2,16 @@
 from typing import List, Optional, Union
 
 import brightway2 as bw
-from bw2data.parameters import ActivityParameter, Group, ParameterBase
+from bw2data.backends.peewee import ExchangeDataset
+from bw2data.parameters import (
+    ActivityParameter, DatabaseParameter, Group, ParameterBase, ProjectParameter
+)
+from bw2parameters.errors import MissingName, ParameterError
 from PySide2.QtCore import QObject, Slot
 from PySide2.QtWidgets import QInputDialog, QMessageBox, QErrorMessage
 
 from activity_browser.bwutils import commontasks as bc
+from activity_browser.bwutils.manager import ParameterManager
 from activity_browser.signals import signals
 from activity_browser.ui.wizards import ParameterWizard
 
@@ -15,7 +20,12 @@ class ParameterController(QObject):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.window = parent
+        # Formula graph of the project, kept between edits of parameter amounts.
+        self.manager: Optional[ParameterManager] = None
+        self.updating_amounts = False
 
+        signals.project_selected.connect(self.reset_manager)
+        signals.parameters_changed.connect(self.reset_manager)
         signals.add_parameter.connect(self.add_parameter)
         signals.add_activity_parameter.connect(self.auto_add_parameter)
         signals.add_activity_parameters.connect(self.multiple_auto_parameters)
@@ -155,6 +165,14 @@ class ParameterController(QObject):
         bw.parameters.recalculate()
         signals.parameters_changed.emit()
 
+    @Slot(name="resetParameterManager")
+    def reset_manager(self) -> None:
+        """Drop the formula graph after the parameters changed in any other
+        way than through `recalculate_dependents`.
+        """
+        if not self.updating_amounts:
+            self.manager = None
+
     @Slot(object, str, object, name="modifyParameter")
     def modify_parameter(self, param: ParameterBase, field: str,
                          value: Union[str, float, list]) -> None:
@@ -172,16 +190,77 @@ class ParameterController(QObject):
                 else:
                     param.data[field] = value
                 param.save()
-                bw.parameters.recalculate()
+                if field == "amount":
+                    self.updating_amounts = self.recalculate_dependents(param)
+                else:
+                    bw.parameters.recalculate()
             except Exception as e:
                 # Anything wrong? Roll the transaction back and throw up a
                 # warning message.
                 transaction.rollback()
+                self.manager = None
                 QMessageBox.warning(
                     self.window, "Could not save changes", str(e),
                     QMessageBox.Ok, QMessageBox.Ok
                 )
         signals.parameters_changed.emit()
+        self.updating_amounts = False
+
+    def recalculate_dependents(self, param: ParameterBase) -> bool:
+        """Recalculate only the parameters and exchanges depending on the
+        changed amount of the given parameter, instead of every parameter
+        and exchange in the expired groups.
+
+        The formula graph of the project is built once and kept until the
+        parameters change in another way, so only the formulas downstream
+        of the parameter are evaluated again. Falls back to a full
+        recalculation if the parameter formulas cannot be resolved by the
+        `ParameterManager`, returns whether the graph could be used.
+        """
+        if isinstance(param, ProjectParameter):
+            group = "project"
+        elif isinstance(param, DatabaseParameter):
+            group = param.database
+        else:
+            group = param.group
+        try:
+            if self.manager is None:
+                self.manager = ParameterManager()
+                self.manager.calculate()
+        except (MissingName, ParameterError):
+            self.manager = None
+            bw.parameters.recalculate()
+            return False
+
+        manager, graph = self.manager, self.manager.graph
+        amounts = [param.amount if (p.group, p.name) == (group, param.name) else p.amount
+                   for p in manager.parameters]
+        manager.recalculate(amounts)
+
+        models = {"project": ProjectParameter, "database": DatabaseParameter, "activity": ActivityParameter}
+        kinds = {(p.group, p.name): p.param_type for p in manager.parameters}
+        groups, dirty = {group}, set()
+        for node in graph.affected([(group, param.name)]):
+            value = float(graph.values[node])
+            if node in kinds:
+                model = models[kinds[node]]
+                query = model.update(amount=value).where(model.name == node[1])
+                if kinds[node] == "database":
+                    query = query.where(model.database == node[0])
+                elif kinds[node] == "activity":
+                    query = query.where(model.group == node[0])
+                query.execute()
+                groups.add(node[0])
+            else:
+                exc = ExchangeDataset.get_by_id(graph.exchange_ids[node[1]])
+                exc.data["amount"] = value
+                exc.save()
+                groups.add(graph.exchange_groups[node[1]])
+                dirty.add(exc.output_database)
+        Group.update(fresh=True).where(Group.name << list(groups)).execute()
+        for db in dirty:
+            bw.databases.set_dirty(db)
+        return True
 
     @Slot(object, str, name="renameParameter")
     def rename_parameter(self, param: ParameterBase, group: str) -> None:
@@ -4,6 +4,7 @@ from PySide2.QtCore import QObject, Slot
 from PySide2 import QtWidgets
 
 from activity_browser.bwutils import commontasks as bc
+from activity_browser.bwutils.characterization import characterization_cache
 from activity_browser.settings import ab_settings
 from activity_browser.signals import signals
 from activity_browser.ui.widgets import TupleNameDialog, ProjectDeletionDialog
@@ -237,6 +238,7 @@ class ImpactCategoryController(QObject):
             idx = next(i for i, c in enumerate(cfs) if c[0] == cf[0])
             cfs[idx] = cf
         method.write(cfs)
+        characterization_cache.invalidate(method.name)
         signals.method_modified.emit(method.name)
 
     @Slot(tuple, tuple, name="modifyMethodWithCf")
@@ -255,4 +257,5 @@ class ImpactCategoryController(QObject):
         else:
             cfs[idx] = cf
         method.write(cfs)
+        characterization_cache.invalidate(method.name)
         signals.method_modified.emit(method.name)
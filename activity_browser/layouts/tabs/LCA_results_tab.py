@@ -1,12 +1,11 @@
 # -*- coding: utf-8 -*-
-import traceback
-
 from bw2calc.errors import BW2CalcError
 from PySide2.QtCore import Qt, Slot
 from PySide2.QtWidgets import QMessageBox, QVBoxLayout
 
 from .LCA_results_tabs import LCAResultsSubTab
 from ..panels import ABTab
+from ...bwutils.errors import CalculationCanceledError, ReferenceFlowValueError
 from ...signals import signals
 
 
@@ -52,20 +51,48 @@ class LCAResultsTab(ABTab):
             name = cs_name
         self.remove_setup(name)
 
-        try:
-            new_tab = LCAResultsSubTab(data, self)
-            self.tabs[name] = new_tab
-            self.addTab(new_tab, name)
-            self.select_tab(self.tabs[name])
-            signals.show_tab.emit("LCA results")
-        except BW2CalcError as e:
-            initial, *other = e.args
-            print(traceback.format_exc())
+        new_tab = LCAResultsSubTab(data, self)
+        new_tab.calculation_failed.connect(
+            lambda error: self.calculation_failed(new_tab, error)
+        )
+        self.tabs[name] = new_tab
+        self.addTab(new_tab, name)
+        self.select_tab(self.tabs[name])
+        signals.show_tab.emit("LCA results")
+
+    def calculation_failed(self, tab: LCAResultsSubTab, error: Exception) -> None:
+        """ Remove the tab of the failed calculation and tell the user why it failed. """
+        if tab in self.tabs.values():
+            self.close_tab(self.indexOf(tab))
+        if isinstance(error, CalculationCanceledError):
+            return
+        if isinstance(error, ReferenceFlowValueError):
+            msg = QMessageBox(
+                QMessageBox.Warning, "Calculation problem", 'Sum of reference flows equals 0',
+                QMessageBox.Ok, self
+            )
+            msg.setInformativeText('A value greater than 0 must be provided for at least one reference flow.\n' +
+                                   'Please enter a valid value before calculating LCA results again.')
+        elif isinstance(error, BW2CalcError):
+            initial, *other = error.args
             msg = QMessageBox(
                 QMessageBox.Warning, "Calculation problem", str(initial),
                 QMessageBox.Ok, self
             )
-            msg.setWindowModality(Qt.ApplicationModal)
             if other:
                 msg.setDetailedText("\n".join(other))
-            msg.exec_()
+        else:
+            msg = QMessageBox(
+                QMessageBox.Warning, "Calculation problem",
+                "An error occurred during the calculation:\n{}".format(error),
+                QMessageBox.Ok, self
+            )
+        msg.setWindowModality(Qt.ApplicationModal)
+        msg.exec_()
+
+    def close_tab(self, index):
+        """ Stop any calculation still running in the tab before closing it. """
+        widget = self.widget(index)
+        if isinstance(widget, LCAResultsSubTab):
+            widget.stop_calculation()
+        super().close_tab(index)
@@ -5,6 +5,7 @@ Each of these classes is either a parent for - or a sub-LCA results tab.
 """
 
 from collections import namedtuple
+import os
 import traceback
 from typing import List, Optional, Union
 import pandas as pd
@@ -13,10 +14,9 @@ from PySide2.QtWidgets import (
     QWidget, QTabWidget, QVBoxLayout, QHBoxLayout, QScrollArea, QRadioButton,
     QLabel, QLineEdit, QCheckBox, QPushButton, QComboBox, QTableView,
     QButtonGroup, QMessageBox, QGroupBox, QGridLayout, QFileDialog,
-    QApplication, QSizePolicy
+    QApplication, QSizePolicy, QProgressBar
 )
 from PySide2 import QtGui, QtCore
-from stats_arrays.errors import InvalidParamsError
 
 from ...bwutils import (
     Contributions, MonteCarloLCA, MLCA,
@@ -24,6 +24,8 @@ from ...bwutils import (
     commontasks as bc,
     calculations,
 )
+from ...bwutils.errors import CalculationCanceledError
+from ...bwutils.sensitivity_analysis import ESTIMATORS
 from ...signals import signals
 from ...ui.figures import (
     LCAResultsPlot, ContributionPlot, CorrelationPlot, LCAResultsBarChart, MonteCarloPlot
@@ -83,6 +85,8 @@ class LCAResultsSubTab(QTabWidget):
     """
 
     update_scenario_box_index = QtCore.Signal(int)
+    calculation_failed = QtCore.Signal(object)
+    mc_ready = QtCore.Signal()
 
     def __init__(self, data: dict, parent=None):
         super().__init__(parent)
@@ -91,7 +95,9 @@ class LCAResultsSubTab(QTabWidget):
         self.has_scenarios = False if data.get('calculation_type') == 'simple' else True
         self.mlca: Optional[Union[MLCA, SuperstructureMLCA]] = None
         self.contributions: Optional[Contributions] = None
-        self.mc: Optional[MonteCarloLCA] = None
+        # The Monte Carlo LCA is only constructed once it is needed, see `mc`.
+        self._mc: Optional[MonteCarloLCA] = None
+        self._mc_thread: Optional[MonteCarloSetupThread] = None
         self.method_dict = dict()
         self.single_func_unit = False
         self.single_method = False
@@ -99,9 +105,59 @@ class LCAResultsSubTab(QTabWidget):
         self.setMovable(True)
         self.setVisible(False)
         self.visible = False
-
-        QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
-        self.mlca, self.contributions, self.mc = calculations.do_LCA_calculations(data)
+        self.tabs: Optional[Tabs] = None
+        self.tab_names = Tabs(
+            inventory="Inventory",
+            results="LCA Results",
+            ef="EF Contributions",
+            process="Process Contributions",
+            sankey="Sankey",
+            mc="Monte Carlo",
+            gsa="Sensitivity Analysis",
+        )
+        self._pending_tabs = []
+
+        # The calculations run in the background, the progress is shown
+        # until the results are in.
+        self.progress_page = CalculationProgressPage(self)
+        self.addTab(self.progress_page, "Calculating")
+        self.worker: Optional[LCACalculationThread] = LCACalculationThread(data, self)
+        self.worker.progress.connect(self.progress_page.update_progress)
+        self.worker.finished.connect(self.calculation_finished)
+        self.progress_page.cancel_button.clicked.connect(self.cancel_calculation)
+        self.worker.start()
+
+    @QtCore.Slot(name="cancelCalculation")
+    def cancel_calculation(self) -> None:
+        """Stop the calculation when the current calculation step is done."""
+        if self.worker is not None:
+            self.worker.cancel()
+            self.progress_page.set_cancelling()
+
+    def stop_calculation(self) -> None:
+        """Cancel a running calculation and let the background threads
+        finish on their own, without waiting for them.
+        """
+        if self.worker is not None:
+            self.worker.progress.disconnect(self.progress_page.update_progress)
+            self.worker.finished.disconnect(self.calculation_finished)
+            self.worker.cancel()
+            release_thread(self.worker)
+            self.worker = None
+        if self._mc_thread is not None:
+            self._mc_thread.finished.disconnect(self.mc_setup_finished)
+            release_thread(self._mc_thread)
+            self._mc_thread = None
+        if self.tabs is not None:
+            self.tabs.mc.stop_calculation()
+
+    @QtCore.Slot(name="calculationFinished")
+    def calculation_finished(self) -> None:
+        worker, self.worker = self.worker, None
+        if worker.error is not None:
+            self.calculation_failed.emit(worker.error)
+            return
+        self.mlca, self.contributions = worker.results
         self.method_dict = bc.get_LCIA_method_name_dict(self.mlca.methods)
         self.single_func_unit = True if len(self.mlca.func_units) == 1 else False
         self.single_method = True if len(self.mlca.methods) == 1 else False
@@ -115,28 +171,62 @@ class LCAResultsSubTab(QTabWidget):
             mc=MonteCarloTab(self),  # mc=None if self.mc is None else MonteCarloTab(self),
             gsa=GSATab(self),
         )
-        self.tab_names = Tabs(
-            inventory="Inventory",
-            results="LCA Results",
-            ef="EF Contributions",
-            process="Process Contributions",
-            sankey="Sankey",
-            mc="Monte Carlo",
-            gsa="Sensitivity Analysis",
-        )
         self.setup_tabs()
-        self.setCurrentWidget(self.tabs.results)
-        self.currentChanged.connect(self.generate_content_on_click)
-        QApplication.restoreOverrideCursor()
+
+    @property
+    def mc(self) -> Optional[MonteCarloLCA]:
+        """The Monte Carlo LCA of the calculation setup, None until it is
+        constructed in the background, see `prepare_mc`.
+        """
+        return self._mc
+
+    def prepare_mc(self) -> None:
+        """Start constructing the Monte Carlo LCA in the background,
+        `mc_ready` is emitted once it is available.
+        """
+        if self._mc is None and self._mc_thread is None:
+            self._mc_thread = MonteCarloSetupThread(self.mlca, self)
+            self._mc_thread.finished.connect(self.mc_setup_finished)
+            self._mc_thread.start()
+
+    @QtCore.Slot(name="mcSetupFinished")
+    def mc_setup_finished(self) -> None:
+        thread, self._mc_thread = self._mc_thread, None
+        thread.deleteLater()
+        try:
+            self._mc = thread.take()
+        except Exception as e:
+            traceback.print_exc()
+            QMessageBox.warning(self, "Could not set up Monte Carlo simulation", str(e))
+            return
+        self.mc_ready.emit()
 
     def setup_tabs(self):
-        """Have all of the tabs pull in their required data and add them."""
-        self._update_tabs()
-        for name, tab in zip(self.tab_names, self.tabs):
-            if tab:
-                self.addTab(tab, name)
-                if hasattr(tab, "configure_scenario"):
-                    tab.configure_scenario()
+        """Have all of the tabs pull in their required data and add them.
+
+        The tabs are added one at a time, each in its own pass of the event
+        loop, so the interface remains responsive while they are built.
+        """
+        self.tabs.sankey.update_calculation_setup(cs_name=self.cs_name)
+        self._pending_tabs = [(name, tab) for name, tab in zip(self.tab_names, self.tabs) if tab]
+        QtCore.QTimer.singleShot(0, self._add_next_tab)
+
+    def _add_next_tab(self) -> None:
+        if not self._pending_tabs:
+            self.removeTab(self.indexOf(self.progress_page))
+            self.progress_page.deleteLater()
+            self.setCurrentWidget(self.tabs.results)
+            self.currentChanged.connect(self.generate_content_on_click)
+            return
+        name, tab = self._pending_tabs.pop(0)
+        if hasattr(tab, "update_tab"):
+            tab.update_tab()
+        self.insertTab(self.indexOf(self.progress_page), tab, name)
+        if hasattr(tab, "configure_scenario"):
+            tab.configure_scenario()
+        if tab is self.tabs.results:
+            self.setCurrentWidget(tab)
+        QtCore.QTimer.singleShot(0, self._add_next_tab)
 
     def _update_tabs(self):
         """Update each sub-tab that can be updated."""
@@ -160,6 +250,8 @@ class LCAResultsSubTab(QTabWidget):
             if not self.tabs.sankey.has_sankey:
                 print('Generating Sankey Tab')
                 self.tabs.sankey.new_sankey()
+        elif index in (self.indexOf(self.tabs.mc), self.indexOf(self.tabs.gsa)):
+            self.prepare_mc()
 
     @QtCore.Slot(name="lciaScenarioExport")
     def generate_lcia_scenario_export(self):
@@ -1069,6 +1161,7 @@ class MonteCarloTab(NewAnalysisTab):
         grid.addWidget(self.include_cf, 1, 0)
         grid.addWidget(self.include_parameters, 1, 1)
         self.include_box.setLayout(grid)
+        self.mc_thread: Optional[MonteCarloWorkerThread] = None
 
         self.add_MC_ui_elements()
 
@@ -1078,6 +1171,9 @@ class MonteCarloTab(NewAnalysisTab):
         self.plot.hide()
         self.plot.plot_name = 'MonteCarlo_' + self.parent.cs_name
         self.layout.addWidget(self.plot)
+        self.statistics_table = LCAResultsTable()
+        self.statistics_table.hide()
+        self.layout.addWidget(self.statistics_table)
         self.export_widget = self.build_export(has_plot=True, has_table=True)
         self.layout.addWidget(self.export_widget)
         self.layout.setAlignment(QtCore.Qt.AlignTop)
@@ -1085,6 +1181,7 @@ class MonteCarloTab(NewAnalysisTab):
 
     def connect_signals(self):
         self.button_run.clicked.connect(self.calculate_mc_lca)
+        self.parent.mc_ready.connect(self.mc_ready)
         # signals.monte_carlo_ready.connect(self.update_mc)
         # self.combobox_fu.currentIndexChanged.connect(self.update_plot)
         self.combobox_methods.currentIndexChanged.connect(
@@ -1107,6 +1204,9 @@ class MonteCarloTab(NewAnalysisTab):
 
         # H-LAYOUT start simulation
         self.button_run = QPushButton('Run')
+        # Enabled once the Monte Carlo LCA is set up in the background.
+        self.button_run.setEnabled(self.parent.mc is not None)
+        self.button_run.setToolTip('Preparing the Monte Carlo simulation...')
         self.label_iterations = QLabel('Iterations:')
         self.iterations = QLineEdit('30')
         self.iterations.setFixedWidth(40)
@@ -1116,6 +1216,15 @@ class MonteCarloTab(NewAnalysisTab):
                                    'Use this for reproducible samples.')
         self.seed = QLineEdit('')
         self.seed.setFixedWidth(30)
+        self.label_workers = QLabel('Processes:')
+        self.label_workers.setToolTip('Number of processes to split the iterations over. '
+                                      'Results are reproducible for the same seed and number of processes.')
+        self.workers = QLineEdit('1')
+        self.workers.setFixedWidth(30)
+        self.workers.setValidator(QtGui.QIntValidator(1, os.cpu_count() or 1))
+        self.streaming = QCheckBox('Store samples on disk', self)
+        self.streaming.setToolTip('Write the samples and results of every iteration to disk instead of '
+                                  'keeping them in memory. Use this for a large number of iterations.')
 
         self.hlayout_run = QHBoxLayout()
         self.hlayout_run.addWidget(self.scenario_label)
@@ -1125,14 +1234,16 @@ class MonteCarloTab(NewAnalysisTab):
         self.hlayout_run.addWidget(self.iterations)
         self.hlayout_run.addWidget(self.label_seed)
         self.hlayout_run.addWidget(self.seed)
+        self.hlayout_run.addWidget(self.label_workers)
+        self.hlayout_run.addWidget(self.workers)
+        self.hlayout_run.addWidget(self.streaming)
         self.hlayout_run.addWidget(self.include_box)
         self.hlayout_run.addStretch(1)
         layout_mc.addLayout(self.hlayout_run)
 
-        # self.label_running = QLabel('Running a Monte Carlo simulation. Please allow some time for this. '
-        #                             'Please do not run another simulation at the same time.')
-        # self.layout_mc.addWidget(self.label_running)
-        # self.label_running.hide()
+        self.label_running = QLabel('Running the Monte Carlo simulation. Please allow some time for this.')
+        layout_mc.addWidget(self.label_running)
+        self.label_running.hide()
 
         # # buttons for all FUs or for all methods
         # self.radio_button_all_fu = QRadioButton("For all reference flows")
@@ -1185,9 +1296,11 @@ class MonteCarloTab(NewAnalysisTab):
     def calculate_mc_lca(self):
         self.method_selection_widget.hide()
         self.plot.hide()
+        self.statistics_table.hide()
         self.export_widget.hide()
 
         iterations = int(self.iterations.text())
+        workers = int(self.workers.text() or 1)
         seed = None
         if self.seed.text():
             print('SEED: ', self.seed.text())
@@ -1204,78 +1317,60 @@ class MonteCarloTab(NewAnalysisTab):
             "cf": self.include_cf.isChecked(),
             "parameters": self.include_parameters.isChecked(),
         }
+        # Solve the iterations with the solver chosen for the LCA calculation.
+        solver = {
+            "solver": self.parent.data.get("solver", "direct"),
+            "tol": self.parent.data.get("solver_tol", 1e-8),
+        }
 
-        QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
-        try:
-            self.parent.mc.calculate(iterations=iterations, seed=seed, **includes)
-            signals.monte_carlo_finished.emit()
-            self.update_mc()
-        except InvalidParamsError as e:  # This can occur if uncertainty data is missing or otherwise broken
-            # print(e)
-            traceback.print_exc()
-            QMessageBox.warning(self, 'Could not perform Monte Carlo simulation', str(e))
-        QApplication.restoreOverrideCursor()
-
-        # a threaded way for this - unfortunatley this crashes as:
-        # pypardsio_solver is used for the 'spsolve' and 'factorized' functions. Python crashes on windows if multiple
-        # instances of PyPardisoSolver make calls to the Pardiso library
-        # worker_thread = WorkerThread()
-        # print('Created local worker_thread')
-        # worker_thread.set_mc(self.parent.mc, iterations=iterations)
-        # print('Passed object to thread.')
-        # worker_thread.start()
-        # self.label_running.show()
-
-        #
+        # Run the simulation in the background, one calculation at a time.
+        self.mc_thread = MonteCarloWorkerThread(
+            self.parent.mc, dict(iterations=iterations, seed=seed, workers=workers,
+                                 streaming=self.streaming.isChecked(), **includes, **solver),
+            self
+        )
+        self.mc_thread.calculated.connect(self.mc_calculated)
+        self.mc_thread.failed.connect(self.mc_failed)
+        self.mc_thread.finished.connect(self.mc_thread.deleteLater)
+        self.button_run.setEnabled(False)
+        self.label_running.show()
+        self.mc_thread.start()
 
-        # thread = NewCSMCThread() #self.parent.mc
-        # thread.calculation_finished.connect(
-        #     lambda x: print('Calculation finished.'))
-        # thread.start()
+    @QtCore.Slot(object, name="mcCalculated")
+    def mc_calculated(self, mc: MonteCarloLCA) -> None:
+        self.mc_thread = None
+        self.label_running.hide()
+        self.button_run.setEnabled(True)
+        signals.monte_carlo_finished.emit()
+        self.update_mc()
 
-        # # give us a thread and start it
-        # thread = QtCore.QThread()
-        # thread.start()
-        #
-        # # create a worker and move it to our extra thread
-        # worker = Worker()
-        # worker.moveToThread(thread)
-
-        # self.parent.mct.start()
-        # self.parent.mct.run(iterations=iterations)
-        # self.parent.mct.finished()
-
-        # objThread = QtCore.QThread()
-        # obj = QObjectMC()  # self.parent.cs_name
-        # obj.moveToThread(objThread)
-        # obj.finished.connect(objThread.quit)
-        # objThread.started.connect(obj.long_running)
-        # # objThread.finished.connect(app.exit)
-        # objThread.finished.connect(
-        #     lambda x: print('Finished Thread!')
-        # )
-        # objThread.start()
-
-        # objThread = QtCore.QThread()
-        # obj = SomeObject()
-        # obj.moveToThread(objThread)
-        # obj.finished.connect(objThread.quit)
-        # objThread.started.connect(obj.long_running)
-        # objThread.finished.connect(
-        #     lambda x: print('Finished Thread!')
-        # )
-        # objThread.start()
-
-        # self.method_selection_widget.show()
-        # self.plot.show()
-        # self.export_widget.show()
+    @QtCore.Slot(object, name="mcFailed")
+    def mc_failed(self, error: Exception) -> None:
+        self.mc_thread = None
+        self.label_running.hide()
+        self.button_run.setEnabled(True)
+        # InvalidParamsError can occur if uncertainty data is missing or otherwise broken
+        QMessageBox.warning(self, 'Could not perform Monte Carlo simulation', str(error))
+
+    def stop_calculation(self) -> None:
+        """Let a running simulation finish in the background, without its results."""
+        if self.mc_thread is not None:
+            self.mc_thread.calculated.disconnect(self.mc_calculated)
+            self.mc_thread.failed.disconnect(self.mc_failed)
+            release_thread(self.mc_thread)
+            self.mc_thread = None
+
+    @QtCore.Slot(name="mcReady")
+    def mc_ready(self) -> None:
+        self.button_run.setEnabled(True)
+        self.button_run.setToolTip('')
 
     def configure_scenario(self):
         super().configure_scenario()
         self.scenario_label.setVisible(self.has_scenarios)
 
     def update_tab(self):
-        self.update_combobox(self.combobox_methods, [str(m) for m in self.parent.mc.methods])
+        self.update_combobox(self.combobox_methods, [str(m) for m in self.parent.mlca.methods])
         # self.update_combobox(self.combobox_methods, [str(m) for m in self.parent.mct.mc.methods])
 
     def update_mc(self, cs_name=None):
@@ -1297,6 +1392,8 @@ class MonteCarloTab(NewAnalysisTab):
 
         self.update_table()
         self.update_plot(method=method)
+        self.statistics_table.model.sync(self.parent.mc.get_statistics_dataframe(method=method))
+        self.statistics_table.show()
         filename = '_'.join([str(x) for x in [self.parent.cs_name, 'Monte Carlo results', str(method)]])
         self.plot.plot_name, self.table.table_name = filename, filename
 
@@ -1323,7 +1420,8 @@ class GSATab(NewAnalysisTab):
         super(GSATab, self).__init__(parent)
         self.parent = parent
 
-        self.GSA = GlobalSensitivityAnalysis(self.parent.mc)
+        # Constructed on the first GSA calculation, when the MC results exist.
+        self.GSA: Optional[GlobalSensitivityAnalysis] = None
 
         self.layout.addLayout(get_header_layout('Global Sensitivity Analysis'))
         self.scenario_box = None
@@ -1390,6 +1488,31 @@ class GSATab(NewAnalysisTab):
         self.cutoff_biosphere.setFixedWidth(40)
         self.cutoff_biosphere.setValidator(QtGui.QDoubleValidator(0.0, 1.0, 5))
 
+        # sensitivity measure, and optionally a cheaper screening before it
+        self.label_estimator = QLabel('Method:')
+        self.combobox_estimator = QComboBox()
+        self.label_screening = QLabel('Screening:')
+        self.combobox_screening = QComboBox()
+        self.combobox_screening.addItem('None', None)
+        for name, estimator in ESTIMATORS.items():
+            self.combobox_estimator.addItem(estimator.label, name)
+            if name != 'delta':
+                self.combobox_screening.addItem(estimator.label, name)
+        self.label_screening_top = QLabel('Keep top:')
+        self.screening_top = QLineEdit('100')
+        self.screening_top.setFixedWidth(40)
+        self.screening_top.setValidator(QtGui.QIntValidator(1, 100000))
+        self.screening_top.setEnabled(False)
+        self.combobox_screening.currentIndexChanged.connect(
+            lambda: self.screening_top.setEnabled(self.combobox_screening.currentData() is not None)
+        )
+
+        # all reference flows and impact categories at once
+        self.checkbox_all = QCheckBox('All reference flows and impact categories')
+        self.checkbox_all.setChecked(False)
+        self.checkbox_all.toggled.connect(self.combobox_fu.setDisabled)
+        self.checkbox_all.toggled.connect(self.combobox_methods.setDisabled)
+
         # export GSA input/output data automatically with run
         self.checkbox_export_data_automatically = QCheckBox('Save input/output data to Excel after run')
         self.checkbox_export_data_automatically.setChecked(False)
@@ -1403,6 +1526,13 @@ class GSATab(NewAnalysisTab):
         self.hlayout_row2.addWidget(self.cutoff_technosphere)
         self.hlayout_row2.addWidget(self.label_cutoff_biosphere)
         self.hlayout_row2.addWidget(self.cutoff_biosphere)
+        self.hlayout_row2.addWidget(self.label_estimator)
+        self.hlayout_row2.addWidget(self.combobox_estimator)
+        self.hlayout_row2.addWidget(self.label_screening)
+        self.hlayout_row2.addWidget(self.combobox_screening)
+        self.hlayout_row2.addWidget(self.label_screening_top)
+        self.hlayout_row2.addWidget(self.screening_top)
+        self.hlayout_row2.addWidget(self.checkbox_all)
         self.hlayout_row2.addWidget(self.checkbox_export_data_automatically)
         # self.hlayout_row2.addWidget(self.checkbox_pedigree)
         self.hlayout_row2.addStretch(1)
@@ -1425,7 +1555,7 @@ class GSATab(NewAnalysisTab):
         # self.label_monte_carlo_first.hide()
 
     def update_tab(self):
-        self.update_combobox(self.combobox_methods, [str(m) for m in self.parent.mc.methods])
+        self.update_combobox(self.combobox_methods, [str(m) for m in self.parent.mlca.methods])
         self.update_combobox(self.combobox_fu, list(self.parent.mlca.func_unit_translation_dict.keys()))
 
     def monte_carlo_finished(self):
@@ -1438,12 +1568,25 @@ class GSATab(NewAnalysisTab):
         method_number = self.combobox_methods.currentIndex()
         cutoff_technosphere = float(self.cutoff_technosphere.text())
         cutoff_biosphere = float(self.cutoff_biosphere.text())
+        options = {
+            'estimator': self.combobox_estimator.currentData(),
+            'screening': self.combobox_screening.currentData(),
+            'screening_top': int(self.screening_top.text() or 100),
+        }
         # print('Calculating GSA for: ', act_number, method_number, cutoff_technosphere, cutoff_biosphere)
 
         try:
             QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
-            self.GSA.perform_GSA(act_number=act_number, method_number=method_number,
-                                 cutoff_technosphere=cutoff_technosphere, cutoff_biosphere=cutoff_biosphere)
+            if self.GSA is None:
+                self.GSA = GlobalSensitivityAnalysis(self.parent.mc)
+            if self.checkbox_all.isChecked():
+                self.GSA.perform_GSA_all(cutoff_technosphere=cutoff_technosphere,
+                                         cutoff_biosphere=cutoff_biosphere, workers=os.cpu_count() or 1,
+                                         **options)
+            else:
+                self.GSA.perform_GSA(act_number=act_number, method_number=method_number,
+                                     cutoff_technosphere=cutoff_technosphere, cutoff_biosphere=cutoff_biosphere,
+                                     **options)
             # self.update_mc()
         except Exception as e:  # Catch any error...
             traceback.print_exc()
@@ -1506,25 +1649,142 @@ class GSATab(NewAnalysisTab):
     #     filename = '_'.join((str(x) for x in fields if x is not None))
 
 
+class CalculationProgressPage(QWidget):
+    """Shows the progress of the LCA calculations of a results tab."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.label = QLabel("Loading the LCA data...")
+        self.progress_bar = QProgressBar()
+        # Busy indicator until the first step is completed.
+        self.progress_bar.setRange(0, 0)
+        self.cancel_button = QPushButton("Cancel")
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.label)
+        layout.addWidget(self.progress_bar)
+        row = QHBoxLayout()
+        row.addWidget(self.cancel_button)
+        row.addStretch(1)
+        layout.addLayout(row)
+        layout.addStretch(1)
+        self.setLayout(layout)
+
+    @QtCore.Slot(int, int, name="updateProgress")
+    def update_progress(self, done: int, total: int) -> None:
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+        self.label.setText("Calculating... ({} of {} steps done)".format(done, total))
+
+    def set_cancelling(self) -> None:
+        self.label.setText("Cancelling the calculation...")
+        self.cancel_button.setEnabled(False)
+
+
+class LCACalculationThread(QtCore.QThread):
+    """Perform the LCA calculations of a results tab in the background.
+
+    The calculation can be cancelled, which takes effect when the current
+    calculation step (loading the data, factorizing or solving the
+    technosphere, or characterizing one method) is completed.
+    """
+    progress = QtCore.Signal(int, int)
+
+    def __init__(self, data: dict, parent=None):
+        super().__init__(parent)
+        self.data = data
+        self.results: Optional[tuple] = None
+        self.error: Optional[Exception] = None
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        self._cancelled = True
+
+    def report_progress(self, done: int, total: int) -> None:
+        if self._cancelled:
+            raise CalculationCanceledError()
+        self.progress.emit(done, total)
+
+    def run(self):
+        with calculations.calculation_lock:
+            try:
+                if self._cancelled:
+                    raise CalculationCanceledError()
+                self.results = calculations.do_LCA_calculations(self.data, self.report_progress)
+            except Exception as e:
+                if not isinstance(e, CalculationCanceledError):
+                    traceback.print_exc()
+                self.error = e
+
+
+# Threads released by `release_thread`, kept alive until they are deleted.
+_released_threads = set()
+
+
+def release_thread(thread: QtCore.QThread) -> None:
+    """Let the thread finish in the background and delete itself afterwards,
+    so its parent can be closed without waiting for it on the GUI thread.
+    """
+    thread.setParent(None)
+    _released_threads.add(thread)
+    thread.destroyed.connect(lambda: _released_threads.discard(thread))
+    thread.finished.connect(thread.deleteLater)
+    if thread.isFinished():
+        thread.deleteLater()
+
+
+class MonteCarloSetupThread(QtCore.QThread):
+    """Construct the Monte Carlo LCA of the MLCA's calculation setup in the
+    background, so opening the Monte Carlo tab does not block the interface.
+    """
+    def __init__(self, mlca, parent=None):
+        super().__init__(parent)
+        self.mlca = mlca
+        self.mc: Optional[MonteCarloLCA] = None
+        self.error: Optional[Exception] = None
+
+    def run(self):
+        # The Monte Carlo LCA borrows the LCA object of the MLCA.
+        with calculations.calculation_lock:
+            try:
+                self.mc = calculations.create_MonteCarloLCA(self.mlca)
+            except Exception as e:
+                self.error = e
+
+    def take(self) -> MonteCarloLCA:
+        """Return the constructed Monte Carlo LCA, raising any error that
+        occurred in the background.
+        """
+        if self.error is not None:
+            raise self.error
+        return self.mc
+
+
 class MonteCarloWorkerThread(QtCore.QThread):
     """A worker for Monte Carlo simulations.
 
-    Unfortunately, pyparadiso does not allow parallel calculations on Windows (crashes).
-    So this is for future reference in case this issue is solved... """
+    The (pypardiso) solvers are not thread-safe, so the simulation holds the
+    calculation lock and waits for any other calculation to finish first.
+    The Monte Carlo LCA is returned through `calculated`, or the error
+    through `failed`.
+    """
+    calculated = QtCore.Signal(object)
+    failed = QtCore.Signal(object)
 
-    def set_mc(self, mc, iterations=20):
+    def __init__(self, mc: MonteCarloLCA, kwargs: dict, parent=None):
+        super().__init__(parent)
         self.mc = mc
-        self.iterations = iterations
+        self.kwargs = kwargs
 
     def run(self):
-        print('Starting new Worker Thread. Iterations:', self.iterations)
-        self.mc.calculate(iterations=self.iterations)
-        # res = bw.GraphTraversal().calculate(self.demand, self.method, self.cutoff, self.max_calc)
-        print('in thread {}'.format(QtCore.QThread.currentThread()))
-        signals.monte_carlo_ready.emit(self.mc.cs_name)
-
-
-worker_thread = MonteCarloWorkerThread()
+        print('Starting new Worker Thread. Iterations:', self.kwargs.get('iterations'))
+        with calculations.calculation_lock:
+            try:
+                self.mc.calculate(**self.kwargs)
+            except Exception as e:
+                traceback.print_exc()
+                self.failed.emit(e)
+                return
+        self.calculated.emit(self.mc)
 
 # class Worker(QtCore.QObject):
 #
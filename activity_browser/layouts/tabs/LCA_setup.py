@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
+import os
 from typing import Optional, Union
 
-from PySide2 import QtWidgets
-from PySide2.QtCore import Slot, Qt
+from PySide2 import QtGui, QtWidgets
+from PySide2.QtCore import QLocale, Slot, Qt
 from brightway2 import calculation_setups
 import pandas as pd
 
@@ -108,6 +109,47 @@ class LCASetupTab(QtWidgets.QWidget):
         self.calculate_button = QtWidgets.QPushButton(qicons.calculate, "Calculate")
         self.calculation_type = QtWidgets.QComboBox()
         self.calculation_type.addItems(["Standard LCA", "Scenario LCA"])
+        self.label_workers = QtWidgets.QLabel("Processes:")
+        self.label_workers.setToolTip("Number of processes to split the scenarios over.")
+        self.workers = QtWidgets.QLineEdit("1")
+        self.workers.setFixedWidth(30)
+        self.workers.setValidator(QtGui.QIntValidator(1, os.cpu_count() or 1))
+        self.label_workers.hide()
+        self.workers.hide()
+        self.label_storage = QtWidgets.QLabel("Contributions:")
+        self.label_storage.setToolTip(
+            "How the process and elementary flow contributions are stored, smaller\n"
+            "storage uses less memory for large calculation setups."
+        )
+        self.storage = QtWidgets.QComboBox()
+        self.storage.addItem("Exact", "float64")
+        self.storage.addItem("Single precision", "float32")
+        self.storage.addItem("Sparse", "sparse")
+        self.label_top_n = QtWidgets.QLabel("Keep top:")
+        self.label_top_n.setToolTip("Only store the largest contributions, leave empty to store all of them.")
+        self.top_n = QtWidgets.QLineEdit()
+        self.top_n.setFixedWidth(40)
+        self.top_n.setValidator(QtGui.QIntValidator(1, 1000000))
+        self.label_top_n.setEnabled(False)
+        self.top_n.setEnabled(False)
+        self.label_solver = QtWidgets.QLabel("Solver:")
+        self.label_solver.setToolTip(
+            "Direct factorizes the technosphere matrix, the iterative solvers reuse\n"
+            "the previous solution and are faster for many similar scenarios."
+        )
+        self.solver = QtWidgets.QComboBox()
+        self.solver.addItem("Direct", "direct")
+        self.solver.addItem("BiCGSTAB", "bicgstab")
+        self.solver.addItem("GMRES", "gmres")
+        self.label_tol = QtWidgets.QLabel("Tolerance:")
+        self.label_tol.setToolTip("Relative tolerance of the iterative solver.")
+        self.tol = QtWidgets.QLineEdit("1e-8")
+        self.tol.setFixedWidth(50)
+        validator = QtGui.QDoubleValidator(0.0, 1.0, 20, self.tol)
+        validator.setLocale(QLocale(QLocale.English))
+        self.tol.setValidator(validator)
+        self.label_tol.setEnabled(False)
+        self.tol.setEnabled(False)
 
         name_row = QtWidgets.QHBoxLayout()
         name_row.addWidget(header('Calculation Setup:'))
@@ -121,6 +163,16 @@ class LCASetupTab(QtWidgets.QWidget):
         calc_row = QtWidgets.QHBoxLayout()
         calc_row.addWidget(self.calculate_button)
         calc_row.addWidget(self.calculation_type)
+        calc_row.addWidget(self.label_workers)
+        calc_row.addWidget(self.workers)
+        calc_row.addWidget(self.label_storage)
+        calc_row.addWidget(self.storage)
+        calc_row.addWidget(self.label_top_n)
+        calc_row.addWidget(self.top_n)
+        calc_row.addWidget(self.label_solver)
+        calc_row.addWidget(self.solver)
+        calc_row.addWidget(self.label_tol)
+        calc_row.addWidget(self.tol)
         calc_row.addStretch(1)
 
         container = QtWidgets.QVBoxLayout()
@@ -177,6 +229,8 @@ class LCASetupTab(QtWidgets.QWidget):
         ))
         signals.calculation_setup_changed.connect(self.save_cs_changes)
         self.calculation_type.currentIndexChanged.connect(self.select_calculation_type)
+        self.storage.currentIndexChanged.connect(self.select_storage)
+        self.solver.currentIndexChanged.connect(self.select_solver)
 
         # Slots
         signals.set_default_calculation_setup.connect(self.set_default_calculation_setup)
@@ -210,12 +264,37 @@ class LCASetupTab(QtWidgets.QWidget):
                 'cs_name': self.list_widget.name,
                 'calculation_type': 'scenario',
                 'data': self.scenario_panel.scenario_dataframe(),
+                'workers': int(self.workers.text() or 1),
             }
         else:
             return
+        data.update(self.calculation_options())
 
         signals.lca_calculation.emit(data)
 
+    def calculation_options(self) -> dict:
+        """Options of the calculation shared by all calculation types."""
+        storage = self.storage.currentData()
+        top_n = self.top_n.text()
+        return {
+            'contribution_storage': storage,
+            'contribution_top_n': int(top_n) if storage == 'sparse' and top_n else None,
+            'solver': self.solver.currentData(),
+            'solver_tol': float(self.tol.text() or 1e-8),
+        }
+
+    @Slot(int, name="changeStorage")
+    def select_storage(self, index: int):
+        sparse = self.storage.itemData(index) == 'sparse'
+        self.label_top_n.setEnabled(sparse)
+        self.top_n.setEnabled(sparse)
+
+    @Slot(int, name="changeSolver")
+    def select_solver(self, index: int):
+        iterative = self.solver.itemData(index) != 'direct'
+        self.label_tol.setEnabled(iterative)
+        self.tol.setEnabled(iterative)
+
     @Slot(name="toggleDefaultCalculation")
     def set_default_calculation_setup(self):
         self.calculation_type.setCurrentIndex(0)
@@ -236,6 +315,12 @@ class LCASetupTab(QtWidgets.QWidget):
         # show/hide items from calc_row
         self.calculate_button.setVisible(show)
         self.calculation_type.setVisible(show)
+        for widget in (self.label_storage, self.storage, self.label_top_n, self.top_n,
+                       self.label_solver, self.solver, self.label_tol, self.tol):
+            widget.setVisible(show)
+        show_workers = show and self.calculation_type.currentIndex() == self.SCENARIOS
+        self.label_workers.setVisible(show_workers)
+        self.workers.setVisible(show_workers)
         # show/hide tables widgets
         self.splitter.setVisible(show)
         self.no_setup_label.setVisible(not(show))
@@ -245,9 +330,13 @@ class LCASetupTab(QtWidgets.QWidget):
         if index == self.DEFAULT:
             # Standard LCA
             self.scenario_panel.hide()
+            self.label_workers.hide()
+            self.workers.hide()
         elif index == self.SCENARIOS:
             # Scenario LCA
             self.scenario_panel.show()
+            self.label_workers.show()
+            self.workers.show()
         self.cs_panel.updateGeometry()
 
     def enable_calculations(self):
@@ -2,7 +2,7 @@
 import json
 import os
 import time
-from typing import List
+from typing import List, Optional
 
 import brightway2 as bw
 from PySide2 import QtWidgets
@@ -10,6 +10,7 @@ from PySide2.QtCore import Slot
 from PySide2.QtWidgets import QComboBox
 
 from .base import BaseGraph, BaseNavigatorWidget
+from ...bwutils import calculations
 from ...bwutils.commontasks import identify_activity_type
 from ...bwutils.superstructure.graph_traversal_with_scenario import GraphTraversalWithScenario
 from ...signals import signals
@@ -51,6 +52,8 @@ class SankeyNavigatorWidget(BaseNavigatorWidget):
         self.methods = []
         self.scenarios = []
         self.graph = Graph()
+        # Graph JSON data of the already calculated scenario sankeys.
+        self.scenario_graphs = {}
 
         # Additional Qt objects
         self.scenario_label = QtWidgets.QLabel('Scenario: ')
@@ -229,24 +232,59 @@ class SankeyNavigatorWidget(BaseNavigatorWidget):
                       max_calc=100) -> None:
         """Calculate LCA, do graph traversal, get JSON graph data for this, and send to javascript."""
         print("Demand / Method: {} {}".format(demand, method))
+        if scenario_lca:
+            key = (scenario_index, str(demand), method_index, cut_off, max_calc)
+            if key in self.scenario_graphs:
+                self.graph.json_data = self.scenario_graphs[key]
+                self.graph.update()
+                self.has_sankey = bool(self.graph.json_data)
+                self.send_json()
+                return
+        # Do not wait for a calculation in the background on the GUI thread.
+        if not calculations.calculation_lock.acquire(blocking=False):
+            QtWidgets.QMessageBox.information(
+                None, "Calculation running",
+                "Another calculation is still running, please try again once it has finished."
+            )
+            return
         start = time.time()
 
         try:
             if scenario_lca:
                 self.parent.mlca.update_lca_calculation_for_sankey(scenario_index, demand, method_index)
                 data = GraphTraversalWithScenario(self.parent.mlca).calculate(demand, method, cutoff=cut_off, max_calc=max_calc)
+            elif self.borrows_lca(demand, method, method_index):
+                # Reuse the loaded and factorized LCA object of the calculation setup.
+                self.parent.mlca.update_lca_calculation(demand, method_index)
+                data = GraphTraversalWithScenario(self.parent.mlca).calculate(demand, method, cutoff=cut_off, max_calc=max_calc)
             else:
-                data = bw.GraphTraversal().calculate(demand, method, cutoff=cut_off, max_calc=max_calc)
+                data = GraphTraversalWithScenario().calculate(demand, method, cutoff=cut_off, max_calc=max_calc)
 
         except ValueError as e:
             QtWidgets.QMessageBox.information(None, "Not possible.", str(e))
+        finally:
+            calculations.calculation_lock.release()
         print("Completed graph traversal ({:.2g} seconds, {} iterations)".format(time.time() - start, data["counter"]))
 
         self.graph.new_graph(data)
+        if scenario_lca:
+            self.scenario_graphs[key] = self.graph.json_data
         self.has_sankey = bool(self.graph.json_data)
         # print("emitting graph ready signal")
         self.send_json()
 
+    def borrows_lca(self, demand: dict, method: tuple, method_index: Optional[int]) -> bool:
+        """Check if the sankey can use the LCA object of the calculation
+        results, which is not the case for random graphs or if the
+        calculation setup was changed after the calculation.
+        """
+        mlca = getattr(self.parent, "mlca", None)
+        if mlca is None or method_index is None or method_index >= len(mlca.methods):
+            return False
+        return mlca.methods[method_index] == method and all(
+            getattr(key, "key", key) in mlca.lca.product_dict for key in demand
+        )
+
     def set_database(self, name):
         """Saves the currently selected database for graphing a random activity"""
         self.selected_db = name
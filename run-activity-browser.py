@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
+import multiprocessing
+
 from activity_browser import run_activity_browser
 
 
-run_activity_browser()
\ No newline at end of file
+# The calculations may use worker processes, which import this script again.
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    run_activity_browser()
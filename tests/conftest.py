@@ -2,6 +2,8 @@
 import shutil
 
 import brightway2 as bw
+import numpy as np
+import pandas as pd
 import pytest
 
 from activity_browser import Application
@@ -54,3 +56,98 @@ def bw2test():
     if "pytest_project" in bw.projects:
         bw.projects.set_current("pytest_project", update=False)
     shutil.rmtree(tempdir)
+
+
+@pytest.fixture()
+def basic_lca(bw2test):
+    """ Small project with uncertain exchanges, three impact categories and
+    a calculation setup of three reference flows, for the calculation tests.
+
+    Returns the name of the calculation setup.
+    """
+    biosphere = bw.Database("biosphere3")
+    biosphere.register()
+    biosphere.write({
+        ("biosphere3", "e{}".format(i)): {
+            "name": "emission {}".format(i), "type": "emission", "unit": "kg", "categories": ("air",),
+        } for i in range(4)
+    })
+    # Every activity uses (some of) the activities after it and emits to air.
+    data = {}
+    for i in range(6):
+        exchanges = [{"input": ("test", "a{}".format(i)), "amount": 1.0, "type": "production"}]
+        exchanges.extend(
+            {"input": ("test", "a{}".format(j)), "amount": 0.1 * (j - i), "type": "technosphere",
+             "uncertainty type": 2, "loc": np.log(0.1 * (j - i)), "scale": 0.1}
+            for j in range(i + 1, min(i + 3, 6))
+        )
+        exchanges.extend(
+            {"input": ("biosphere3", "e{}".format(e)), "amount": 0.5 + 0.1 * (i + e), "type": "biosphere",
+             "uncertainty type": 2, "loc": np.log(0.5 + 0.1 * (i + e)), "scale": 0.2}
+            for e in range(4) if (i + e) % 3
+        )
+        data[("test", "a{}".format(i))] = {
+            "name": "activity {}".format(i), "unit": "kg", "location": "GLO",
+            "reference product": "product {}".format(i), "exchanges": exchanges,
+        }
+    database = bw.Database("test")
+    database.register(depends=["biosphere3"])
+    database.write(data)
+    for m in range(3):
+        method = bw.Method(("test method", str(m)))
+        method.register(unit="points")
+        method.write([(("biosphere3", "e{}".format(e)), 1.0 + m + e) for e in range(4) if e != m])
+    bw.calculation_setups["basic"] = {
+        "inv": [{("test", "a0"): 1}, {("test", "a2"): 2.0}, {("test", "a3"): 0.5}],
+        "ia": [("test method", "0"), ("test method", "1"), ("test method", "2")],
+    }
+    return "basic"
+
+
+@pytest.fixture()
+def parameterized_lca(basic_lca):
+    """ Adds project, database and activity parameters to the `basic_lca`
+    project, with a parameterized exchange in each of the two activity groups.
+
+    Returns the name of the calculation setup.
+    """
+    bw.parameters.new_project_parameters([
+        {"name": "p1", "amount": 2.0, "uncertainty type": 4, "minimum": 1.0, "maximum": 3.0},
+        {"name": "p2", "amount": 6.0, "formula": "p1 * 3"},
+        {"name": "p3", "amount": 1.0},
+    ])
+    bw.parameters.new_database_parameters([
+        {"name": "d1", "amount": 7.0, "formula": "p2 + 1"},
+    ], "test")
+    for i, formula in ((1, "d1 * 0.5"), (2, "p3 + 0.1")):
+        key = ("test", "a{}".format(i))
+        group = "a{}_group".format(i)
+        bw.parameters.new_activity_parameters([
+            {"name": "ap", "amount": 1.0, "formula": formula, "database": key[0], "code": key[1]},
+        ], group)
+        act = bw.get_activity(key)
+        exc = next(iter(act.technosphere()))
+        exc["formula"] = "ap / 10"
+        exc.save()
+        bw.parameters.add_exchanges_to_group(group, act)
+    bw.parameters.recalculate()
+    return basic_lca
+
+
+@pytest.fixture()
+def scenario_df(basic_lca):
+    """ Superstructure scenarios for the `basic_lca` calculation setup,
+    changing a technosphere and a biosphere exchange. The values of the
+    third scenario are missing, which keeps the original amounts.
+    """
+    index = pd.MultiIndex.from_tuples([
+        (("test", "a1"), ("test", "a0"), "technosphere"),
+        (("biosphere3", "e1"), ("test", "a2"), "biosphere"),
+        (("test", "a4"), ("test", "a2"), "technosphere"),
+    ], names=["input", "output", "flow"])
+    return pd.DataFrame({
+        "s1": [0.2, 1.0, 0.3],
+        "s2": [0.4, 0.5, 0.3],
+        "s3": [np.nan, np.nan, np.nan],
+        "s4": [0.4, 2.0, 0.1],
+    }, index=index)
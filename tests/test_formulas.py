@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from bw2data.backends.peewee import ExchangeDataset
+import numpy as np
+
+from activity_browser.bwutils.manager import ParameterManager
+
+
+def test_formula_graph_calculate(parameterized_lca):
+    """ The compiled formulas give the same amounts as brightway."""
+    pm = ParameterManager()
+    expected = [ExchangeDataset.get_by_id(pk).data["amount"] for pk in pm.graph.exchange_ids]
+    # p1 = 2 -> p2 = 6 -> d1 = 7 -> ap = 3.5 -> 0.35; p3 = 1 -> ap = 1.1 -> 0.11
+    assert np.allclose(expected, [0.35, 0.11])
+    assert np.allclose(pm.calculate(), expected)
+
+
+def test_formula_graph_update(parameterized_lca):
+    pm = ParameterManager()
+    pm.calculate()
+    assert pm.graph.affected([("project", "p1")]) == [
+        ("project", "p2"), ("test", "d1"), ("a1_group", "ap"), ("exchange", 0)
+    ]
+
+    amounts = np.array([p.amount for p in pm.parameters])
+    amounts[pm.graph.inputs.index(("project", "p1"))] = 4.0
+    pm.graph.values[("a2_group", "ap")] = -1.0
+    assert np.allclose(pm.graph.update(amounts)[0], 0.65)
+    # Formulas that do not depend on p1 are not evaluated again.
+    assert pm.graph.values[("a2_group", "ap")] == -1.0
+
+
+def test_formula_graph_evaluate_samples(parameterized_lca):
+    pm = ParameterManager()
+    amounts = np.array([p.amount for p in pm.parameters])
+    samples = np.repeat(amounts[:, np.newaxis], 4, axis=1)
+    samples[pm.graph.inputs.index(("project", "p1"))] = [1.0, 2.0, 3.0, 4.0]
+    samples[pm.graph.inputs.index(("project", "p3"))] = [0.0, 1.0, 2.0, 3.0]
+    data = pm.graph.evaluate(samples)
+    assert data.shape == (2, 4)
+    for i in range(4):
+        assert np.allclose(data[:, i], pm.graph.update(samples[:, i]))
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from activity_browser.bwutils import MonteCarloLCA
+from activity_browser.bwutils.streaming import RunningStatistics
+
+
+def test_streaming_equals_in_memory(parameterized_lca):
+    in_memory = MonteCarloLCA(parameterized_lca)
+    in_memory.calculate(iterations=5, seed=42)
+    streaming = MonteCarloLCA(parameterized_lca)
+    streaming.calculate(iterations=5, seed=42, streaming=True)
+
+    assert np.allclose(np.asarray(streaming.results), in_memory.results)
+    for m in in_memory.methods:
+        assert np.allclose(np.asarray(streaming.CF_dict[m]), np.vstack(in_memory.CF_dict[m]))
+
+    # The sampled matrix values are rebuilt from the stored samples.
+    indices = np.argwhere(in_memory.A_matrices[0].toarray())
+    expected = np.array([A.toarray()[tuple(indices.T)] for A in in_memory.A_matrices])
+    assert np.allclose(streaming.get_exchange_samples(indices), expected)
+    indices = np.argwhere(in_memory.B_matrices[0].toarray())
+    expected = np.array([B.toarray()[tuple(indices.T)] for B in in_memory.B_matrices])
+    assert np.allclose(streaming.get_exchange_samples(indices, biosphere=True), expected)
+
+
+def test_running_statistics():
+    samples = np.random.default_rng(0).lognormal(size=(2000, 2, 3))
+    statistics = RunningStatistics.from_samples(samples)
+    assert statistics.count == 2000
+    assert np.allclose(statistics.mean, samples.mean(axis=0))
+    assert np.allclose(statistics.variance, samples.var(axis=0, ddof=1))
+    for p in RunningStatistics.QUANTILES:
+        exact = np.quantile(samples, p, axis=0)
+        assert np.allclose(statistics.quantile(p), exact, rtol=0.1)
+
+
+def test_running_statistics_few_samples():
+    samples = np.arange(6.0).reshape(3, 2)
+    statistics = RunningStatistics.from_samples(samples)
+    assert np.allclose(statistics.quantile(0.5), np.median(samples, axis=0))
+    assert np.isnan(RunningStatistics((2,)).variance).all()
+
+
+def test_exchange_samples_all_positions(basic_lca):
+    """ Every position of the matrices is rebuilt, including those without
+    an exchange, and no positions are requested at all."""
+    in_memory = MonteCarloLCA(basic_lca)
+    in_memory.calculate(iterations=3, seed=1)
+    streaming = MonteCarloLCA(basic_lca)
+    streaming.calculate(iterations=3, seed=1, streaming=True)
+    assert streaming.get_exchange_samples([]).shape == (3, 0)
+    for matrices, biosphere in ((in_memory.A_matrices, False), (in_memory.B_matrices, True)):
+        indices = np.argwhere(np.ones(matrices[0].shape))
+        expected = np.array([m.toarray().ravel() for m in matrices])
+        assert np.allclose(streaming.get_exchange_samples(indices, biosphere=biosphere), expected)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import brightway2 as bw
+import numpy as np
+import pytest
+
+from activity_browser.bwutils import MLCA
+
+
+def test_batched_solve_equals_lci(basic_lca):
+    """ Solving all reference flows at once gives the same results as a
+    separate LCA per reference flow and impact category.
+    """
+    mlca = MLCA(basic_lca)
+    mlca.calculate()
+    cs = bw.calculation_setups[basic_lca]
+    for row, func_unit in enumerate(cs["inv"]):
+        for col, method in enumerate(cs["ia"]):
+            lca = bw.LCA(func_unit, method)
+            lca.lci()
+            lca.lcia()
+            assert np.isclose(mlca.lca_scores[row, col], lca.score)
+            assert np.allclose(mlca.process_contributions[row, col], lca.characterized_inventory.sum(axis=0).A1)
+            assert np.allclose(mlca.elementary_flow_contributions[row, col],
+                               lca.characterized_inventory.sum(axis=1).A1)
+        assert np.allclose(mlca.scaling_factors[str(func_unit)], lca.supply_array)
+        assert np.allclose(mlca.inventory[str(func_unit)], lca.inventory.sum(axis=1).A1)
+
+
+def test_calculation_progress(basic_lca):
+    """ Progress is reported after every stage and can abort the calculation."""
+    calls = []
+    mlca = MLCA(basic_lca, progress=lambda done, total: calls.append((done, total)))
+    mlca.calculate()
+    total = mlca.progress_total
+    assert total == 4 + len(mlca.methods)
+    assert calls == [(done, total) for done in range(1, total + 1)]
+    assert mlca.progress is None
+
+    class Stop(Exception):
+        pass
+
+    def stop(done, total):
+        if done > MLCA.LOAD_STEPS:
+            raise Stop()
+    mlca = MLCA(basic_lca)
+    with pytest.raises(Stop):
+        mlca.calculate(stop)
+    assert not mlca.lca_scores.any()
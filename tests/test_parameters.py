@@ -5,6 +5,7 @@ from bw2data.parameters import (ActivityParameter, DatabaseParameter, Group,
 from PySide2 import QtCore, QtWidgets
 import pytest
 
+from activity_browser.controllers.parameter import ParameterController
 from activity_browser.signals import signals
 from activity_browser.ui.tables.delegates import FormulaDelegate
 from activity_browser.ui.tables.parameters import (
@@ -339,3 +340,26 @@ def test_delete_activity_param(qtbot):
     assert ActivityParameter.select().count() == 0
     # Group is automatically removed with the last parameter gone
     assert not Group.select().where(Group.name == group).exists()
+
+
+def test_recalculate_dependents(parameterized_lca):
+    """ Editing a parameter amount only writes the parameters and exchanges
+    downstream of it, with the same results as a full recalculation.
+    """
+    controller = ParameterController()
+    exchange = lambda i: next(iter(bw.get_activity(("test", "a{}".format(i))).technosphere())).amount
+    for amount in (4.0, 5.0):
+        controller.modify_parameter(ProjectParameter.get(name="p1"), "amount", amount)
+        assert controller.manager is not None
+        assert DatabaseParameter.get(name="d1").amount == amount * 3 + 1
+        assert exchange(1) == pytest.approx((amount * 3 + 1) * 0.05)
+        assert exchange(2) == pytest.approx(0.11)
+        assert all(g.fresh for g in Group.select())
+
+    # Other changes to the parameters drop the formula graph.
+    controller.modify_parameter(ProjectParameter.get(name="p3"), "formula", "p1 / 2")
+    assert controller.manager is None
+    assert exchange(2) == pytest.approx(0.26)
+    controller.modify_parameter(ProjectParameter.get(name="p1"), "amount", 2.0)
+    assert exchange(1) == pytest.approx(0.35)
+    assert exchange(2) == pytest.approx(0.11)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import brightway2 as bw
+import numpy as np
+import pytest
+
+from activity_browser.bwutils import MLCA, SuperstructureMLCA
+from activity_browser.bwutils.calculations import do_LCA_calculations
+from activity_browser.bwutils.result_cache import ResultCache
+
+OPTIONS = {'storage': 'float64', 'top_n': None, 'solver': 'direct', 'tol': 1e-8}
+
+
+def test_cache_key(basic_lca, scenario_df):
+    key = ResultCache.key(basic_lca, OPTIONS)
+    assert key == ResultCache.key(basic_lca, dict(OPTIONS))
+    for option, value in (('storage', 'sparse'), ('top_n', 10), ('solver', 'gmres'), ('tol', 1e-6)):
+        assert ResultCache.key(basic_lca, dict(OPTIONS, **{option: value})) != key
+
+    scenario_key = ResultCache.key(basic_lca, OPTIONS, scenario_df)
+    assert scenario_key != key
+    changed = scenario_df.copy()
+    changed.iloc[0, 0] = 0.3
+    assert ResultCache.key(basic_lca, OPTIONS, changed) != scenario_key
+
+    # Changing a database of the calculation setup invalidates the results.
+    act = bw.get_activity(("test", "a0"))
+    act["name"] = "changed activity"
+    act.save()
+    assert ResultCache.key(basic_lca, OPTIONS) != key
+
+
+@pytest.mark.parametrize("calculation_type", ["simple", "scenario"])
+def test_cached_calculation(basic_lca, scenario_df, monkeypatch, calculation_type):
+    """ A cached calculation is returned without constructing, factorizing
+    or calculating the MLCA again.
+    """
+    data = {'cs_name': basic_lca, 'calculation_type': calculation_type, 'data': scenario_df}
+    mlca, _ = do_LCA_calculations(data)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The MLCA should be restored from the cache")
+    monkeypatch.setattr(MLCA, "__init__", fail)
+    monkeypatch.setattr(MLCA, "calculate", fail)
+    cached, contributions = do_LCA_calculations(data)
+    assert cached is not mlca and type(cached) is type(mlca)
+    assert contributions.mlca is cached
+    assert not hasattr(cached.lca, "solver")
+    assert np.allclose(cached.lca_scores, mlca.lca_scores)
+    assert np.allclose(cached.process_contributions[:], mlca.process_contributions[:])
+    if isinstance(cached, SuperstructureMLCA):
+        assert cached.current == mlca.current
+    key = (str(mlca.func_units[0]), 0) if calculation_type == "scenario" else str(mlca.func_units[0])
+    assert np.allclose(cached.inventories[key].toarray(), mlca.inventories[key].toarray())
+
+    # The restored LCA object can still be solved, e.g. for the Sankey diagram.
+    monkeypatch.undo()
+    cached.update_lca_calculation(cached.func_units[0], 1)
+    mlca.update_lca_calculation(mlca.func_units[0], 1)
+    assert cached.lca.score == pytest.approx(mlca.lca.score)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import brightway2 as bw
+import numpy as np
+import pytest
+
+from activity_browser.bwutils import MonteCarloLCA
+from activity_browser.bwutils.sensitivity_analysis import (
+    ESTIMATORS, GlobalSensitivityAnalysis, analyze, analyze_borgonovo, analyze_delta, calculate_lca,
+    filter_technosphere_exchanges_matrix, get_mc_lca, get_problem, transform_Y,
+)
+
+
+@pytest.fixture()
+def linear_model():
+    """ Y depends strongly on x0, weakly on x1 and not at all on x2."""
+    X = np.random.default_rng(42).uniform(1, 2, size=(500, 3))
+    Y = 5 * X[:, 0] + X[:, 1]
+    return get_problem(X, ["x0", "x1", "x2"]), X, Y
+
+
+@pytest.mark.parametrize("estimator", ["borgonovo", "srrc", "src", "spearman"])
+def test_estimators_rank_inputs(linear_model, estimator):
+    problem, X, Y = linear_model
+    df = analyze(problem, X, Y, estimator)
+    assert ESTIMATORS[estimator].sort_by in df.columns
+    assert list(df.index) == ["x0", "x1", "x2"]
+
+
+def test_regression_coefficients(linear_model):
+    problem, X, Y = linear_model
+    src = analyze(problem, X, Y, "src")["SRC"]
+    # For an exact linear model these are the coefficients scaled by the standard deviations.
+    expected = np.array([5, 1, 0]) * X.std(axis=0) / Y.std()
+    assert np.allclose(src[["x0", "x1", "x2"]], expected)
+    # Inputs without variation get a coefficient of 0.
+    X[:, 2] = 1.5
+    assert analyze(problem, X, Y, "srrc").loc["x2", "SRRC"] == 0
+
+
+def test_borgonovo_independent_input():
+    """ The histogram estimate is 0 for an input of which all classes share
+    the distribution of Y, and grows with the dependence of Y on the input."""
+    X = np.repeat(np.arange(4.0), 4)[:, None]
+    Y = np.tile(np.arange(4.0), 4)
+    assert np.isclose(analyze_borgonovo(None, X, Y)["borgonovo"][0], 0)
+    assert np.isclose(analyze_borgonovo(None, X, X[:, 0])["borgonovo"][0], 0.5)
+
+
+def test_delta(linear_model):
+    problem, X, Y = linear_model
+    if "delta" not in analyze_delta(problem, X, Y):
+        pytest.skip("The installed SALib does not provide the 'delta' measure.")
+    df = analyze(problem, X, Y, "delta")
+    assert df.index[0] == "x0"
+
+
+def test_screening(linear_model):
+    problem, X, Y = linear_model
+    df = analyze(problem, X, Y, "src", screening="spearman", screening_top=2)
+    assert list(df.index) == ["x0", "x1"]
+    # No screening if there are no more inputs than are kept.
+    df = analyze(problem, X, Y, "src", screening="spearman", screening_top=3)
+    assert len(df) == 3
+
+
+def test_transform_Y():
+    Y = np.array([1.0, 10.0, 100.0])
+    assert np.allclose(transform_Y(Y), np.log(Y))
+    assert np.allclose(transform_Y(-Y), -np.log(Y))
+    assert np.array_equal(transform_Y(np.array([-1.0, 1.0])), [-1.0, 1.0])
+
+
+def test_filter_technosphere_exchanges_matrix(basic_lca):
+    """ The contributions follow from the supply and the impact of producing
+    one unit of each product, as given by a separate LCA."""
+    cs = bw.calculation_setups[basic_lca]
+    lca = bw.LCA(cs["inv"][0], cs["ia"][0])
+    lca.lci()
+    lca.lcia()
+    rev_product = {v: k for k, v in lca.product_dict.items()}
+
+    def unit_score(row):
+        unit = bw.LCA({rev_product[row]: 1}, cs["ia"][0])
+        unit.lci()
+        unit.lcia()
+        return unit.score
+    A = lca.technosphere_matrix.tocoo()
+    contributions = {
+        (i, j): -v * lca.supply_array[j] * unit_score(i)
+        for i, j, v in zip(A.row, A.col, A.data) if i != j
+    }
+    cutoff = 0.01
+    expected = [k for k, v in contributions.items() if abs(v) > abs(lca.score) * cutoff]
+    indices = filter_technosphere_exchanges_matrix(lca, cutoff)
+    assert sorted(indices) == sorted(expected)
+    magnitudes = [abs(contributions[k]) for k in indices]
+    assert magnitudes == sorted(magnitudes, reverse=True)
+
+
+def test_mc_lca(basic_lca):
+    """ A single non-stochastic LCA of all reference flows gives the scores
+    of the separate LCAs, also after the Monte Carlo iterations."""
+    mc = MonteCarloLCA(basic_lca)
+    mc.calculate(iterations=3, seed=1)
+    lca = get_mc_lca(mc)
+    assert lca.product_dict == mc.lca.product_dict
+    for fu in mc.cs["inv"]:
+        for method in mc.cs["ia"]:
+            calculate_lca(lca, fu, method)
+            separate = bw.LCA(fu, method)
+            separate.lci()
+            separate.lcia()
+            assert np.isclose(lca.score, separate.score)
+
+
+def test_perform_GSA_all(basic_lca):
+    """ The batch GSA gives the same (univariate) sensitivities as the GSA
+    of every single reference flow and impact category."""
+    mc = MonteCarloLCA(basic_lca)
+    mc.calculate(iterations=20, seed=1)
+    gsa = GlobalSensitivityAnalysis(mc)
+    df = gsa.perform_GSA_all(estimator="spearman")
+    assert not df.empty
+    for act_number, fu in enumerate(mc.cs["inv"]):
+        for method_number, method in enumerate(mc.cs["ia"]):
+            gsa.perform_GSA(act_number, method_number, estimator="spearman")
+            single = gsa.df_final.set_index("GSA name")["spearman"]
+            batch = df[(df["reference flow"] == str(mc.rev_activity_index[act_number]))
+                       & (df["impact category"] == str(method))].set_index("GSA name")["spearman"]
+            assert set(single.index) <= set(batch.index)
+            assert np.allclose(single, batch[single.index])
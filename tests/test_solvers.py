@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+from activity_browser.bwutils import MLCA
+from activity_browser.bwutils.solvers import IterativeSolver, iterative_solver
+
+
+def technosphere(size: int, rng: np.random.Generator) -> sparse.csr_matrix:
+    """Diagonally dominant technosphere with random inputs."""
+    inputs = sparse.random(size, size, density=0.05, random_state=rng) * 0.5
+    inputs.setdiag(0)
+    return (sparse.identity(size) - inputs).tocsr()
+
+
+@pytest.mark.parametrize("method", ["bicgstab", "gmres"])
+@pytest.mark.parametrize("preconditioner", ["lu", "ilu"])
+def test_iterative_solver(method, preconditioner):
+    """ A series of perturbed matrices is solved within the tolerance of
+    the direct solution. The tolerance is relative to the norm of each
+    demand column.
+    """
+    rng = np.random.default_rng(0)
+    matrix = technosphere(100, rng)
+    demand = np.zeros((100, 3))
+    demand[[0, 10, 20], [0, 1, 2]] = 1
+    solver = IterativeSolver(method, tol=1e-10, preconditioner=preconditioner)
+    for _ in range(5):
+        perturbed = matrix.copy()
+        perturbed.data *= rng.lognormal(0, 0.05, perturbed.data.size)
+        supply = solver.solve(perturbed, demand)
+        expected = spsolve(perturbed.tocsc(), demand)
+        residual = np.linalg.norm(demand - perturbed @ supply, axis=0)
+        assert (residual <= 1e-10 * np.linalg.norm(demand, axis=0)).all()
+        error = np.linalg.norm(supply - expected, axis=0)
+        assert (error <= 1e-8 * np.linalg.norm(expected, axis=0)).all()
+    # Only the first matrix is factorized, for the complete LU preconditioner.
+    assert solver.factorizations == (1 if preconditioner == "lu" else 0)
+
+
+def test_iterative_solver_options():
+    assert iterative_solver("direct") is None
+    assert iterative_solver("gmres", 1e-6).tol == 1e-6
+    with pytest.raises(ValueError):
+        iterative_solver("cholesky")
+
+
+@pytest.mark.parametrize("solver", ["bicgstab", "gmres"])
+def test_mlca_iterative_solver(basic_lca, solver):
+    direct = MLCA(basic_lca)
+    direct.calculate()
+    mlca = MLCA(basic_lca, solver=solver, tol=1e-10)
+    mlca.calculate()
+    assert np.allclose(mlca.lca_scores, direct.lca_scores, rtol=1e-8)
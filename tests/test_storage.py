@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from activity_browser.bwutils import MLCA
+from activity_browser.bwutils.storage import ContributionStorage
+
+
+@pytest.fixture()
+def contributions():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(3, 2, 50))
+    values[values < 0.5] = 0
+    return values
+
+
+@pytest.mark.parametrize("backend", ["float64", "float32", "sparse"])
+def test_storage_round_trip(backend, contributions):
+    storage = ContributionStorage(contributions.shape, backend)
+    storage[:, :] = contributions
+    rtol = 1e-6 if backend == "float32" else 0
+    assert np.allclose(storage[:, :], contributions, rtol=rtol, atol=0)
+    assert np.allclose(storage[1], contributions[1], rtol=rtol, atol=0)
+    assert np.allclose(storage[:, 1], contributions[:, 1], rtol=rtol, atol=0)
+    assert np.allclose(storage.take(2, axis=0), contributions[2], rtol=rtol, atol=0)
+    assert storage[2, 1].dtype == np.float64
+    if backend != "float64":
+        assert storage.nbytes < contributions.nbytes
+
+
+def test_sparse_storage_top_n(contributions):
+    storage = ContributionStorage(contributions.shape, "sparse", top_n=5)
+    storage[:, :] = contributions
+    stored = storage[:, :]
+    assert ((stored != 0).sum(axis=-1) <= 5).all()
+    # The largest contributions of every row are kept exactly.
+    largest = np.sort(np.abs(contributions), axis=-1)[..., -5:]
+    assert np.array_equal(np.sort(np.abs(stored), axis=-1)[..., -5:], largest)
+
+
+def test_sparse_storage_index_items():
+    storage = ContributionStorage((2, 2, 4), "sparse")
+    with pytest.raises(IndexError):
+        storage[0, 0, 1]
+
+
+@pytest.mark.parametrize("backend", ["float32", "sparse"])
+def test_mlca_storage(basic_lca, backend):
+    exact = MLCA(basic_lca)
+    exact.calculate()
+    mlca = MLCA(basic_lca, storage=backend)
+    mlca.calculate()
+    assert np.allclose(mlca.process_contributions[:, :], exact.process_contributions[:, :], rtol=1e-6)
+    assert np.allclose(mlca.elementary_flow_contributions[:, :], exact.elementary_flow_contributions[:, :],
+                       rtol=1e-6)
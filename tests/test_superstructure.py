@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from activity_browser.bwutils import SuperstructureMLCA
+from activity_browser.bwutils.superstructure.mlca import _calculate_scenario, _initialize_scenario_worker
+
+
+def assert_same_results(mlca, other):
+    assert np.allclose(mlca.lca_scores, other.lca_scores)
+    assert np.allclose(mlca.process_contributions[:], other.process_contributions[:])
+    assert np.allclose(mlca.elementary_flow_contributions[:], other.elementary_flow_contributions[:])
+    assert mlca.scaling_factors.keys() == other.scaling_factors.keys()
+    for key, supply in mlca.scaling_factors.items():
+        assert np.allclose(supply, other.scaling_factors[key])
+        assert np.allclose(mlca.inventories[key].toarray(), other.inventories[key].toarray())
+
+
+@pytest.mark.parametrize("storage", ["float64", "sparse"])
+def test_scenario_tasks(basic_lca, scenario_df, storage):
+    """ The scenario tasks of the worker processes give the same results as
+    the sequential calculation, in whatever order they complete.
+
+    The tasks are run in this process, as worker processes cannot open the
+    temporary test project.
+    """
+    sequential = SuperstructureMLCA(basic_lca, scenario_df, storage=storage)
+    sequential.calculate()
+    mlca = SuperstructureMLCA(basic_lca, scenario_df, workers=2, storage=storage)
+    _initialize_scenario_worker(*mlca._worker_args)
+    for ps_col in (2, 0, 3, 1):
+        results, _ = _calculate_scenario(ps_col)
+        mlca._store_scenario_results(ps_col, results)
+    assert_same_results(mlca, sequential)
+    # Only the scenarios that change biosphere values keep a biosphere matrix.
+    assert sorted(mlca.biosphere_matrices) == [0, 1, 3]
+
+
+def test_scenario_tasks_shared_biosphere(basic_lca, scenario_df):
+    """ Scenarios that do not change the biosphere do not return a copy of
+    the biosphere matrix, the inventories use the shared matrix instead.
+    """
+    scenario_df = scenario_df.drop(index="biosphere", level="flow")
+    sequential = SuperstructureMLCA(basic_lca, scenario_df)
+    sequential.calculate()
+    mlca = SuperstructureMLCA(basic_lca, scenario_df, workers=2)
+    _initialize_scenario_worker(*mlca._worker_args)
+    for ps_col in range(mlca.total):
+        results, _ = _calculate_scenario(ps_col)
+        assert results["biosphere"] is None
+        mlca._store_scenario_results(ps_col, results)
+    assert not mlca.biosphere_matrices
+    assert_same_results(mlca, sequential)
+
+
+def test_set_scenario_order(basic_lca, scenario_df):
+    """ Applying the scenarios in any order gives the same matrices and
+    scores as applying them one after the other.
+    """
+    mlca = SuperstructureMLCA(basic_lca, scenario_df)
+    matrices, scores = [], []
+    for ps_col in range(mlca.total):
+        mlca.set_scenario(ps_col)
+        matrices.append((mlca.lca.technosphere_matrix.toarray(), mlca.lca.biosphere_matrix.toarray()))
+        scores.append(mlca._scenario_results(lambda *args: None)["scores"])
+    # The missing values of the third scenario keep the original amounts.
+    base = SuperstructureMLCA(basic_lca, scenario_df)
+    assert np.array_equal(matrices[2][0], base.lca.technosphere_matrix.toarray())
+    assert np.array_equal(matrices[2][1], base.lca.biosphere_matrix.toarray())
+
+    for ps_col in np.random.default_rng(0).permutation(np.repeat(np.arange(mlca.total), 3)):
+        mlca.set_scenario(ps_col)
+        technosphere, biosphere = matrices[ps_col]
+        assert np.array_equal(mlca.lca.technosphere_matrix.toarray(), technosphere)
+        assert np.array_equal(mlca.lca.biosphere_matrix.toarray(), biosphere)
+        assert np.allclose(mlca._scenario_results(lambda *args: None)["scores"], scores[ps_col])
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from pathlib import Path
+import runpy
+
+import activity_browser
+
+LAUNCHER = str(Path(__file__).parents[1] / "run-activity-browser.py")
+
+
+def test_launcher_in_worker_process(monkeypatch):
+    """ Spawned worker processes import the launcher as '__mp_main__', which
+    must not start another Activity Browser.
+    """
+    calls = []
+    monkeypatch.setattr(activity_browser, "run_activity_browser", lambda: calls.append(1), raising=False)
+    runpy.run_path(LAUNCHER, run_name="__mp_main__")
+    assert not calls
+    runpy.run_path(LAUNCHER, run_name="__main__")
+    assert calls == [1]